@@ -1,11 +1,16 @@
-import json
 import pandas as pd
-from datetime import datetime
 import numpy as np
 import matplotlib.pyplot as plt
 
+from activity_cube import NO_GAMES, cube_totals, load_activity_tables
+
 input_activity = r"output\lichess_activity_matched.jsonl"
 input_csv = r"analisi\output_analisi\analisi1_elo_clustering.csv"
+output_ci_quarterly = r"analisi\output_analisi\analisi1_ci_quarterly.csv"
+output_elo_period = r"analisi\output_analisi\analisi1_elo_{period}.csv"
+
+ELO_GAME_TYPE = "Standard"  # controllo FIDE dei Δ Elo (il CSV di 00 contiene Standard, Rapid e Blitz)
+ELO_PERIODS = []  # roll-up Δ Elo in più oltre all'annuale: "quarter" (unito al CI trimestrale), "rolling12"
 
 PAD_ANNUAL_12  = True 
 
@@ -15,112 +20,213 @@ w_ultra  = 1.00
 w_bullet = 0.60
 w_blitz  = 0.30
 
+# colonna → speed lichess usati per il CI
+CI_SPEEDS = {"ultrabullet": "ultraBullet", "bullet": "bullet", "blitz": "blitz", "rapid": "rapid"}
+
+SPEED_COLS = list(CI_SPEEDS)
+P95_Q = 95  # percentile globale delle partite al giorno oltre cui un giorno è "heavy"
+
 def load_activity_jsonl(path):
     """
-    Legge il JSONL di activity e crea un dataframe con colonne:
-    user, year, month, ultrabullet, bullet, blitz, rapid
+    Dal cubo delle activity (activity_cube.py) crea:
+    - un dataframe con colonne user, year, month, ultrabullet, bullet, blitz, rapid
+      (una riga per utente e mese, nell'ordine di prima comparsa)
+    - la tabella giornaliera user, year, month, tot_matches (un giorno per riga)
+    """
+    cube, daily = load_activity_tables(path)
+    df = cube_totals(cube, ["user_id", "month"], CI_SPEEDS)
+    df = df.loc[df["month"] != NO_GAMES].reset_index(drop=True)  # utenti senza activity
+    df.insert(1, "year", df["month"].str.slice(0, 4).astype(int))
+    df["month"] = df["month"].str.slice(5, 7).astype(int)
+
+    # anno e mese dalle categorie dei giorni (poche migliaia), non riga per riga
+    days = daily["day"].cat.categories
+    day_codes = daily["day"].cat.codes.to_numpy()
+    daily = pd.DataFrame({
+        "user": daily["user_id"].astype(str).to_numpy(),
+        "year": days.str.slice(0, 4).astype(int).to_numpy()[day_codes],
+        "month": days.str.slice(5, 7).astype(int).to_numpy()[day_codes],
+        "tot_matches": daily["tot_matches"].to_numpy(),
+    })
+    return df.rename(columns={"user_id": "user"}), daily
+
+def _py_round(values, ndigits=4):
     """
-    rows = []
-    with open(path, "r", encoding="utf-8") as f:
-        for line in f:
-            if not line.strip():
-                continue
-            rec = json.loads(line)
-            for user, sessions in rec.items():
-                for s in sessions:
-                    start = datetime.utcfromtimestamp(s["interval"]["start"] / 1000.0)
-                    games = s.get("games", {}) or {}
-
-                    def ssum(tag):
-                        d = games.get(tag, {}) or {}
-                        return int(d.get("win", 0)) + int(d.get("loss", 0)) + int(d.get("draw", 0))
-
-                    rows.append({
-                        "user": user,
-                        "year": start.year,
-                        "month": start.month,
-                        "ultrabullet": ssum("ultraBullet"),
-                        "bullet":     ssum("bullet"),
-                        "blitz":      ssum("blitz"),
-                        "rapid":      ssum("rapid"),
-                    })
-
-    df = pd.DataFrame(rows)
-    if df.empty:
-        df = pd.DataFrame(columns=["user","year","month","ultrabullet","bullet","blitz","rapid"])
-    return df
-
-def compute_ci_tables(df):
+    Stesso risultato di round() di Python su float ma vettoriale: np.round
+    può differire solo quando il valore scalato cade a ridosso di ,5, e solo
+    quei pochi elementi passano da round().
+    """
+    values = np.asarray(values, dtype=float)
+    out = np.round(values, ndigits)
+    scaled = values * 10.0 ** ndigits
+    near_tie = np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6 + np.abs(scaled) * 1e-12
+    for i in np.flatnonzero(near_tie):
+        out[i] = round(float(values[i]), ndigits)
+    return out
+
+def _period_groups(df, daily, quarterly):
+    """
+    Gruppi (utente, anno[, trimestre]) nell'ordine di prima comparsa in df,
+    come groupby(sort=False), su una chiave intera invece che su stringhe.
+    Restituisce (id gruppo per riga di df, id gruppo per riga di daily (-1 se
+    il gruppo non è in df), chiavi dei gruppi).
+    """
+    def key(frame):
+        u = frame["user_code"].to_numpy()
+        q = (frame["month"].to_numpy() - 1) // 3 + 1 if quarterly else 0
+        return np.where(u >= 0, u * 100_000 + frame["year"].to_numpy() * 10 + q, -1)
+
+    ids, uniq = pd.factorize(key(df))
+    day_ids = pd.Index(uniq).get_indexer(key(daily))
+    return ids, day_ids, uniq
+
+def _ci_table(df, daily, users, quarterly, p95):
+    """Tabella CI per (user, year [, quarter]) con poche somme colonnari (bincount)."""
+    period = "quarter" if quarterly else "year"
+    ids, day_ids, uniq = _period_groups(df, daily, quarterly)
+    n = len(uniq)
+
+    def group_sum(idx, values):
+        return np.bincount(idx, weights=values, minlength=n).round().astype(np.int64)
+
+    U, B, Z, R = (group_sum(ids, df[c].to_numpy(dtype=float)) for c in SPEED_COLS)
+    T = U + B + Z + R
+    fast = U + B + Z
+    max_fast = int(fast.max()) if n else 0
+
+    has_games = T > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        frequency = np.where(has_games, np.minimum(1.0, fast / max_fast), 0.0)
+        fast_quality = np.where(has_games, (w_ultra*U + w_bullet*B + w_blitz*Z) / T, 0.0)
+    CI = (w_freq * frequency) + (w_fast * fast_quality)
+
+    out = pd.DataFrame({"user": users[uniq // 100_000], "year": (uniq % 100_000) // 10})
+    if quarterly:
+        out["quarter"] = uniq % 10
+    # come nel vecchio ciclo: frequency e CI erano np.float64 (round di numpy),
+    # fast_quality un float Python (round di Python)
+    out["frequency"] = np.round(frequency, 4)
+    out["fast_quality"] = _py_round(fast_quality)
+    out["CI"] = np.round(CI, 4)
+    out[f"ultra_bullet_blitz_games_{period}"] = np.where(has_games, fast, 0)
+    out[f"max_ultra_bullet_blitz_games_{period}"] = max_fast
+    out["ultrabullet"], out["bullet"], out["blitz"], out["rapid"], out["total"] = U, B, Z, R, T
+
+    # --- Diagnostiche sul volume giornaliero ---
+    found = day_ids >= 0
+    idx = day_ids[found]
+    games_day = daily["tot_matches"].to_numpy()[found]
+    active_days = np.bincount(idx, minlength=n)
+    games_days = group_sum(idx, games_day.astype(float))
+    heavy_count = np.bincount(idx, weights=games_day > p95, minlength=n).astype(np.int64)
+    max_games_day = np.zeros(n, dtype=np.int64)
+    np.maximum.at(max_games_day, idx, games_day)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        games_per_day = np.where(active_days > 0, games_days / active_days, 0.0)
+        peakness = np.where(games_per_day > 0, max_games_day / games_per_day, 0.0)
+        heavy_pct = np.where(active_days > 0, 100.0 * heavy_count / active_days, 0.0)
+    out["active_days"] = active_days
+    out["games_per_day"] = np.round(games_per_day, 4)
+    out["max_games_day"] = max_games_day
+    out["peakness"] = np.round(peakness, 4)
+    out["P95_games_per_day_used"] = p95
+    out["heavy_count"] = heavy_count
+    out["heavy_pct_legacy"] = np.round(heavy_pct, 4)
+    return out
+
+def compute_ci_tables(df, daily):
     """
     Calcola tabelle annuale e trimestrale con:
     - frequency, fast_quality, peakness, CI
     - diagnostiche: games/day, P95_games_per_day_used, heavy_count, heavy_pct_legacy
 
     P95 globale (P95_games_day) per annuale e trimestrale.
+
+    frequency = partite ultrabullet+bullet+blitz del periodo / massimo tra tutti
+    gli utenti-periodo; fast_quality = media pesata degli speed veloci sul totale.
+    Sul volume giornaliero (tutti gli speed, giorni con partite): games_per_day
+    medio, peakness = giorno di picco / games_per_day, heavy_count = giorni
+    oltre il P95 globale delle partite al giorno, heavy_pct_legacy = % dei
+    giorni attivi che sono heavy.
     """
-    df['tot_ultra_bullet_blitz_games'] = df['ultrabullet'] + df['bullet'] + df['blitz']
-    max_ultra_bullet_blitz_games_year = df.groupby(["user","year"])['tot_ultra_bullet_blitz_games'].sum().max()
-
-    annual_rows = []
-
-    for (user, year), g in df.groupby(["user","year"], sort=False):
-        U = int(g["ultrabullet"].sum()); B = int(g["bullet"].sum())
-        Z = int(g["blitz"].sum());      R = int(g["rapid"].sum())
-        T = U + B + Z + R
-
-        # --- Annuale ---
-        if T == 0:
-            ultra_bullet_blitz_games_year = 0.0
-            frequency = 0.0
-            fast_quality = 0.0
-        else:
-            ultra_bullet_blitz_games_year = U + B + Z
-            frequency = min(1.0, ultra_bullet_blitz_games_year / max_ultra_bullet_blitz_games_year) 
-            fast_quality = (w_ultra*U + w_bullet*B + w_blitz*Z)/T
-
-        CI = (w_freq * frequency) + (w_fast * fast_quality)
-
-        annual_rows.append({
-            "user": user,
-            "year": int(year),
-            "frequency": round(frequency, 4),
-            "fast_quality": round(fast_quality, 4),
-            "CI": round(CI, 4),
-            "ultra_bullet_blitz_games_year": int(ultra_bullet_blitz_games_year),
-            "max_ultra_bullet_blitz_games_year": int(max_ultra_bullet_blitz_games_year),  
-            "ultrabullet": U, "bullet": B, "blitz": Z, "rapid": R, "total": T,
-        })
-
-    return pd.DataFrame(annual_rows) 
-
-def agg_annual(group: pd.DataFrame) -> pd.Series:
-    """Aggregazione annuale dei Δ Elo."""
-    rating_level = group.iloc[0]['rating_level']
-    start_rating = group.iloc[0]["start_rating"]
-    end_rating   = group.iloc[-1]["end_rating"]
-    delta_total  = end_rating - start_rating
-    active_sum = int(group["month_active"].sum())
-    return pd.Series({
-        "rating_level": rating_level,
-        "start_rating_year": start_rating,
-        "end_rating_year": end_rating,
-        "delta_elo_year": delta_total,
-        "active_months_year": active_sum,
-    })
+    # utenti codificati una volta sola (ordine di prima comparsa in df)
+    user_codes, users = pd.factorize(df["user"].to_numpy())
+    df = df.assign(user_code=user_codes)
+    daily = daily.assign(user_code=pd.Index(users).get_indexer(daily["user"].to_numpy()))
+    games_day = daily["tot_matches"].to_numpy(dtype=float)
+    p95 = float(np.percentile(games_day, P95_Q)) if len(games_day) else float("nan")
+
+    annual = _ci_table(df, daily, users, False, p95)
+    quarterly = _ci_table(df, daily, users, True, p95)
+    return annual, quarterly
 
-df_activity = load_activity_jsonl(input_activity)
-ci_ann = compute_ci_tables(df_activity)
+def elo_rollup(df_elo, period="year"):
+    """
+    Aggregazione dei Δ Elo mensili per periodo, con sole operazioni colonnari:
+    rating_level e start_rating del primo mese, end_rating dell'ultimo,
+    delta e numero di mesi attivi.
+    - "year":      per (user_id, year)
+    - "quarter":   per (user_id, year, quarter)
+    - "rolling12": per (user_id, month) sulla finestra dei 12 mesi che
+                   terminano in month (window_start, months_in_window)
+    I mesi di ogni utente sono presi in ordine cronologico (nel CSV di 00 sono
+    ordinati per fascia di rating).
+    """
+    d = df_elo.sort_values(["user_id", "month"], kind="stable").reset_index(drop=True)
+    d["year"] = d["month"].str.slice(0, 4).astype(int)
+    month_num = d["month"].str.slice(5, 7).astype(int)
+
+    if period == "rolling12":
+        # chiave intera crescente (utente, mese): l'inizio della finestra di ogni
+        # riga è la prima riga dello stesso utente con mese > mese - 12
+        user_code = pd.factorize(d["user_id"])[0]
+        key = user_code * 1_000_000 + d["year"].to_numpy() * 12 + month_num.to_numpy() - 1
+        first = np.searchsorted(key, key - 11, side="left")
+        active_cum = np.concatenate([[0], np.cumsum(d["month_active"].to_numpy())])
+        out = d[["user_id", "month"]].copy()
+        out["window_start"] = d["month"].to_numpy()[first]
+        out["months_in_window"] = np.arange(len(d)) - first + 1
+        first_rows = d.iloc[first].reset_index(drop=True)
+        last_rows = d
+        active = active_cum[np.arange(len(d)) + 1] - active_cum[first]
+    else:
+        keys = ["user_id", "year"]
+        if period == "quarter":
+            d["quarter"] = (month_num - 1) // 3 + 1
+            keys.append("quarter")
+        elif period != "year":
+            raise ValueError(f"periodo non supportato: {period}")
+        first_rows = d.drop_duplicates(keys, keep="first").reset_index(drop=True)
+        last_rows = d.drop_duplicates(keys, keep="last").reset_index(drop=True)
+        out = first_rows[keys].copy()
+        active = d.groupby(keys, sort=False)["month_active"].sum().to_numpy()
+
+    out["rating_level"] = first_rows["rating_level"].to_numpy()
+    out[f"start_rating_{period}"] = first_rows["start_rating"].to_numpy()
+    out[f"end_rating_{period}"] = last_rows["end_rating"].to_numpy()
+    out[f"delta_elo_{period}"] = out[f"end_rating_{period}"] - out[f"start_rating_{period}"]
+    out[f"active_months_{period}"] = active.astype(np.int64)
+    return out
+
+df_activity, df_daily = load_activity_jsonl(input_activity)
+ci_ann, ci_q = compute_ci_tables(df_activity, df_daily)
+ci_q.to_csv(output_ci_quarterly, index=False)
 df_elo  = pd.read_csv(input_csv)
+df_elo  = df_elo.loc[df_elo["game_type"] == ELO_GAME_TYPE]
 
 ci_ann = ci_ann.loc[ci_ann["ultra_bullet_blitz_games_year"] > 0]
 
-df_elo["year"] = df_elo["month"].str.slice(0, 4).astype(int)
-elo_ann = (
-        df_elo.groupby(["user_id","year"], as_index=False)
-        .apply(agg_annual).reset_index(drop=True)
-    )
+elo_ann = elo_rollup(df_elo, "year")
 elo_ann = elo_ann.loc[elo_ann["active_months_year"] > 0]
 
+# roll-up aggiuntivi (stesso percorso vettoriale)
+for period in ELO_PERIODS:
+    elo_p = elo_rollup(df_elo, period)
+    elo_p = elo_p.loc[elo_p[f"active_months_{period}"] > 0]
+    if period == "quarter":
+        elo_p = ci_q.merge(elo_p, left_on=["user","year","quarter"], right_on=["user_id","year","quarter"], how="inner")
+    elo_p.to_csv(output_elo_period.format(period=period), index=False)
+
 ann_inner = ci_ann.merge(elo_ann, left_on=["user","year"], right_on=["user_id","year"], how="inner")
 ann_inner.to_csv(r"Analisi\output_analisi\analisi1_ci_delta_elo_join_inner.csv", index=False)
 
@@ -0,0 +1,40 @@
+import os
+
+from lichess_games_stats import GROUPINGS, scan_games, merge_and_save
+from metrics import write_run_metrics
+
+# Statistiche globali e mensili da UNA sola lettura di lichess_games_matched.jsonl
+# (sostituisce l'esecuzione in sequenza dei due script 03_analisi2_*_stats_lichess.py)
+
+# --- CONFIG ---
+jsonl_path = r"C:\Users\user\OneDrive\Desktop\progetto scacchi\definitivi\lichess_games_matched.jsonl"
+openings_path = r"C:\Users\user\OneDrive\Desktop\progetto scacchi\analisi_2\openings_with_ply.tsv"
+n_workers = os.cpu_count() or 1  # 1 = modalità seriale
+state_path = None  # es. "stats_lichess.state.pkl": modalità incrementale, legge solo le righe nuove
+metrics_dir = "metrics"  # un JSON per run con tempi, record/s e memoria di picco per fase
+
+# raggruppamento → (CSV percentili da arricchire, CSV di output)
+outputs = {
+    "global": ("global_delta_rating_percentiles.csv", "global_stats_lichess.csv"),
+    "monthly": ("monthly_delta_rating_percentiles.csv", "monthly_stats_lichess.csv"),
+}
+
+# raggruppamento → CSV lungo della curva di svantaggio (una riga per gruppo
+# e soglia di lichess_games_stats.SWEEP_THRESHOLDS); {} per non scriverli
+sweep_outputs = {
+    "global": "global_disadvantage_sweep.csv",
+    "monthly": "monthly_disadvantage_sweep.csv",
+}
+
+if __name__ == "__main__":  # necessario per il pool di processi (spawn su Windows)
+    # --- LEGGI JSONL E AGGREGA PER TUTTI I RAGGRUPPAMENTI ---
+    stats = scan_games(jsonl_path, openings_path, groupings=list(outputs), n_workers=n_workers, state_path=state_path,
+                       sweep=bool(sweep_outputs))
+
+    # --- MERGE E SALVA ---
+    for name, (csv_path, output_path) in outputs.items():
+        merge_and_save(stats[name], csv_path, output_path, GROUPINGS[name])
+        if name in sweep_outputs:
+            merge_and_save(stats[f"{name}_sweep"], csv_path, sweep_outputs[name], GROUPINGS[name])
+
+    write_run_metrics(metrics_dir, "03_analisi2_stats_lichess", n_workers=n_workers)
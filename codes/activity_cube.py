@@ -0,0 +1,156 @@
+import pickle
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from incremental_state import load_state, pending_ranges, save_state
+from jsonl_reader import iter_jsonl
+from table_cache import atomic_output, cache_is_fresh, write_cache_meta
+
+# Cubo delle activity Lichess: lichess_activity_matched.jsonl letto UNA volta
+# e ridotto a (user_id, month, speed) → win, loss, draw, salvato accanto al
+# JSONL (pickle) e ricostruito solo se il JSONL cambia.
+# Totali globali, mensili e per anno/speed si ottengono dal cubo solo
+# aggregando (cube_totals), senza rileggere il JSONL.
+#
+# Le righe sono nell'ordine di prima comparsa nel JSONL (come i vecchi
+# groupby(sort=False) sulle sessioni). Un intervallo di activity senza partite
+# lascia una riga con speed "" e contatori a zero, così utente e mese restano
+# nel cubo con totale 0 (un utente senza activity: month e speed "").
+#
+# Nello stesso passaggio si tiene anche la tabella giornaliera
+# (user_id, day) → tot_matches (tutti gli speed, solo giorni con partite),
+# per le diagnostiche sul volume di gioco al giorno.
+
+CUBE_VERSION = 2
+CUBE_KEYS = ["user_id", "month", "speed"]
+CUBE_COUNTS = ["win", "loss", "draw"]
+DAILY_KEYS = ["user_id", "day"]
+NO_GAMES = ""
+
+
+def _parse_cube(jsonl_path, start=0, end=None):
+    cells = {}
+    days = {}
+    for obj in iter_jsonl(jsonl_path, start, end):
+        for user_id, activities in obj.items():
+            if not activities:
+                cells.setdefault((user_id, NO_GAMES, NO_GAMES), [0, 0, 0])
+            for act in activities:
+                # mese (e giorno) dal campo interval.start
+                dt = datetime.utcfromtimestamp(act["interval"]["start"] / 1000)
+                month = dt.strftime("%Y-%m")
+                games = act.get("games", {}) or {}
+                if not games:
+                    cells.setdefault((user_id, month, NO_GAMES), [0, 0, 0])
+                tot_act = 0
+                for speed, gstats in games.items():
+                    gstats = gstats or {}
+                    cell = cells.setdefault((user_id, month, speed), [0, 0, 0])
+                    win, loss, draw = int(gstats.get("win", 0)), int(gstats.get("loss", 0)), int(gstats.get("draw", 0))
+                    cell[0] += win
+                    cell[1] += loss
+                    cell[2] += draw
+                    tot_act += win + loss + draw
+                if tot_act:
+                    day = (user_id, dt.strftime("%Y-%m-%d"))
+                    days[day] = days.get(day, 0) + tot_act
+    cube = pd.DataFrame(
+        [(*key, *counts) for key, counts in cells.items()],
+        columns=CUBE_KEYS + CUBE_COUNTS,
+    )
+    daily = pd.DataFrame(
+        [(*key, tot) for key, tot in days.items()],
+        columns=DAILY_KEYS + ["tot_matches"],
+    )
+    return cube, daily
+
+
+def _compact(blocks):
+    # più blocchi (append incrementali) → una riga per cella, ordine di prima comparsa
+    cube = pd.concat([b[0] for b in blocks], ignore_index=True)
+    cube = cube.groupby(CUBE_KEYS, sort=False, as_index=False)[CUBE_COUNTS].sum()
+    for col in CUBE_KEYS:
+        cube[col] = cube[col].astype("category")
+    for col in CUBE_COUNTS:
+        cube[col] = cube[col].astype("int64")
+
+    daily = pd.concat([b[1] for b in blocks], ignore_index=True)
+    daily = daily.groupby(DAILY_KEYS, sort=False, as_index=False)["tot_matches"].sum()
+    for col in DAILY_KEYS:
+        daily[col] = daily[col].astype("category")
+    daily["tot_matches"] = daily["tot_matches"].astype("int64")
+    return cube, daily
+
+
+def cube_cache_path(jsonl_path):
+    return Path(jsonl_path).with_suffix(".cube.pkl")
+
+
+def load_activity_tables(jsonl_path, state_path=None):
+    """
+    (cubo, tabella giornaliera) del JSONL delle activity.
+    Senza state_path si usa la cache accanto al JSONL (ricostruita se il
+    contenuto cambia); con state_path la modalità incrementale di
+    incremental_state.py (si leggono solo le righe aggiunte).
+    """
+    if state_path is not None:
+        signature = ("activity_cube", CUBE_VERSION)
+        state = load_state(state_path, signature)
+        ranges = pending_ranges(state, [jsonl_path]) if state is not None else None
+        if ranges is None:
+            state = None
+            ranges = pending_ranges(None, [jsonl_path])
+        blocks = [state["data"]] if state is not None else [_parse_cube(jsonl_path, 0, 0)]
+        blocks += [_parse_cube(path, start, end) for path, start, end in ranges]
+        tables = _compact(blocks)
+        save_state(state_path, signature, [jsonl_path], tables, ranges, state)
+        return tables
+
+    cache_path = cube_cache_path(jsonl_path)
+    meta_path = cache_path.with_suffix(".meta.json")
+    fresh, fingerprints = cache_is_fresh(meta_path, [jsonl_path], CUBE_VERSION)
+    if fresh and cache_path.exists():
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+
+    tables = _compact([_parse_cube(jsonl_path)])
+    # pickle completo al suo posto prima dei metadati (01 e 04 possono ricostruirlo insieme)
+    with atomic_output(cache_path) as tmp:
+        with open(tmp, "wb") as f:
+            pickle.dump(tables, f, protocol=pickle.HIGHEST_PROTOCOL)
+    write_cache_meta(meta_path, fingerprints, CUBE_VERSION, rows=len(tables[0]), daily_rows=len(tables[1]))
+    return tables
+
+
+def load_activity_cube(jsonl_path, state_path=None):
+    """Cubo (user_id, month, speed) → win, loss, draw (vedi load_activity_tables)."""
+    return load_activity_tables(jsonl_path, state_path)[0]
+
+
+def cube_totals(cube, by, speeds=None):
+    """
+    Aggrega il cubo per le colonne `by` (tra user_id, month, speed e year),
+    nell'ordine di prima comparsa.
+    - speeds=None: una colonna tot_matches = win + loss + draw su tutti gli speed
+    - speeds={colonna: speed lichess}: una colonna di totali per ogni speed
+    """
+    df = cube
+    if "year" in by and "year" not in df.columns:
+        df = df[df["month"] != NO_GAMES]  # utenti senza activity: nessun anno
+        df = df.assign(year=df["month"].astype(str).str.slice(0, 4).astype(int))
+    total = df["win"] + df["loss"] + df["draw"]
+    if speeds is None:
+        cols = {"tot_matches": total}
+    else:
+        speed = df["speed"].astype(str)
+        cols = {out: total.where(speed == name, 0) for out, name in speeds.items()}
+    out = (
+        df[by].assign(**cols)
+        .groupby(by, sort=False, observed=True, as_index=False)[list(cols)].sum()
+    )
+    for col in by:
+        if isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = out[col].astype(str)
+    return out
@@ -0,0 +1,100 @@
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from jsonl_reader import DECODERS, get_decoder, iter_lines
+
+# Benchmark dei decoder JSON sui JSONL della pipeline.
+# Per ogni file confronta il vecchio ciclo (testo + json.loads riga per riga)
+# con il lettore condiviso (binario a blocchi) e ogni decoder installato.
+# Uso: python bench_json_decoders.py [file.jsonl ...]
+
+inputs = [
+    r"output\fide_scraping_user.jsonl",                                                        # 00
+    r"output\lichess_activity_matched.jsonl",                                                  # 01, 04
+    r"output\lichess_users.jsonl",                                                             # 02
+    r"C:\Users\user\OneDrive\Desktop\progetto scacchi\definitivi\lichess_games_matched.jsonl",  # 03, openings
+]
+output_file = "bench_json_decoders.csv"
+repeat = 3  # si tiene il tempo migliore
+
+
+def legacy_loop(path):
+    n = 0
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            n += 1
+    return n
+
+
+def reader_loop(path, loads, errors):
+    n = 0
+    for _, line in iter_lines(path):
+        if not line:
+            continue
+        try:
+            loads(line)
+        except errors:
+            continue
+        n += 1
+    return n
+
+
+def best_time(func, *args):
+    best = None
+    n = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        n = func(*args)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, n
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or inputs
+    rows = []
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"{path}: non trovato, salto")
+            continue
+        size_mb = os.path.getsize(path) / 1e6
+
+        variants = [("legacy text + json", legacy_loop, (path,))]
+        for name in DECODERS:
+            try:
+                _, loads, errors = get_decoder(name)
+            except ImportError:
+                print(f"{name}: non installato")
+                continue
+            variants.append((f"reader + {name}", reader_loop, (path, loads, errors)))
+
+        base = None
+        for label, func, args in variants:
+            elapsed, n = best_time(func, *args)
+            base = base or elapsed
+            rows.append({
+                "file": os.path.basename(path),
+                "size_mb": round(size_mb, 1),
+                "variant": label,
+                "lines": n,
+                "seconds": round(elapsed, 4),
+                "mb_per_s": round(size_mb / elapsed, 1) if elapsed else None,
+                "lines_per_s": round(n / elapsed) if elapsed else None,
+                "speedup": round(base / elapsed, 2) if elapsed else None,
+            })
+
+    df = pd.DataFrame(rows)
+    if not df.empty:
+        print(df.to_string(index=False))
+        df.to_csv(output_file, index=False)
+        print(f"Risultati salvati in {output_file}")
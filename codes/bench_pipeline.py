@@ -0,0 +1,194 @@
+import ast
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from metrics import peak_memory_mb
+from synthetic_data import count_rows, generate
+
+# Benchmark della pipeline su dati sintetici (synthetic_data.py) a più scale.
+# Per ogni scala genera i JSONL in <bench_dir>/scale_<n> (riusati se già
+# generati con la stessa scala e seed), poi esegue in ordine ogni script
+# 00–04 e quelli delle aperture, ciascuno in un processo separato e con i
+# percorsi di input/output della configurazione sostituiti con i file
+# sintetici. Per ogni script riporta tempo, righe al secondo (righe del suo
+# input principale) e memoria di picco (massimo tra il processo e i suoi
+# worker).
+#
+# "cold": cache su disco (.store.npz, .cube.pkl, .ratings.npz, .parquet, ...)
+# cancellate prima della run; con --warm una seconda run con le cache pronte.
+#
+# Uso: python bench_pipeline.py [n_partite ...] [--warm] [--seed N] [--dir DIR]
+
+bench_dir = "bench_pipeline"
+output_file = "bench_pipeline.csv"
+scales = [10**3, 10**4, 10**5]
+CACHE_PATTERNS = ["*.meta.json", "*.npz", "*.pkl", "*.parquet", "*.state.pkl"]
+
+# (stage, script, configurazioni sostituite come espressioni Python, righe di input)
+# righe: chiave dei conteggi di synthetic_data.generate o "csv:<file>"
+STAGES = [
+    ("elo_clustering", "00_analisi1_elo_clustering.py",
+     {"input_file": "'fide_scraping_user.jsonl'", "output_file": "'analisi1_elo_clustering.csv'"},
+     "fide_entries"),
+    ("ci_delta_elo", "01_analisi1_ci_delta_elo.py",
+     {"input_activity": "'lichess_activity_matched.jsonl'", "input_csv": "'analisi1_elo_clustering.csv'",
+      "output_ci_quarterly": "'analisi1_ci_quarterly.csv'", "output_elo_period": "'analisi1_elo_{period}.csv'"},
+     "activities"),
+    # gli output dei due 02 hanno già i nomi letti dallo 03
+    ("global_rating_clustering", "02_analisi2_global_rating_clustering.py",
+     {"input_file": "'lichess_users.jsonl'", "output_file": "'global_delta_rating_percentiles.csv'"},
+     "rating_entries"),
+    ("monthly_rating_clustering", "02_analisi2_monthly_rating_clustering.py",
+     {"input_file": "'lichess_users.jsonl'", "output_file": "'monthly_delta_rating_percentiles.csv'"},
+     "rating_entries"),
+    ("openings_tsv", "generate_csv_openings.py",
+     {"path": "Path('openings')"},
+     "opening_rows"),
+    ("stats_lichess", "03_analisi2_stats_lichess.py",
+     {"jsonl_path": "'lichess_games_matched.jsonl'", "openings_path": "'openings/openings_with_ply.tsv'"},
+     "games"),
+    ("tot_matches", "04_analisi2_global_stats_lichess_tot_matches.py",
+     {"activity_jsonl": "'lichess_activity_matched.jsonl'"},
+     "activities"),
+    ("openings_by_user", "openings_by_user_gametype.py",
+     {"input_file": "'lichess_games_matched.jsonl'"},
+     "games"),
+    ("openings_enriched", "openings_by_user_gametype_enriched.py", {}, "csv:openings_by_user_gametype_long.csv"),
+    ("openings_definitivo", "openings_definitivo.py", {}, "csv:openings_by_user_gametype_enriched_long.csv"),
+    # stesso openings_definitivo.csv in un solo passaggio sulle partite
+    ("openings_streaming", "openings_streaming.py",
+     {"input_file": "'lichess_games_matched.jsonl'"},
+     "games"),
+]
+
+CODE_DIR = Path(__file__).resolve().parent
+
+
+def run_script(script, overrides):
+    """
+    Esegue lo script come __main__ sostituendo le assegnazioni di primo
+    livello delle variabili in `overrides` (nome → espressione Python).
+    """
+    path = CODE_DIR / script
+    tree = ast.parse(path.read_text(encoding="utf-8"), filename=str(path))
+    replaced = set()
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and len(node.targets) == 1 and isinstance(node.targets[0], ast.Name):
+            name = node.targets[0].id
+            if name in overrides and name not in replaced:
+                node.value = ast.parse(overrides[name], mode="eval").body
+                replaced.add(name)
+    missing = set(overrides) - replaced
+    if missing:
+        raise ValueError(f"{script}: configurazioni non trovate {sorted(missing)}")
+    code = compile(ast.fix_missing_locations(tree), str(path), "exec")
+    t0 = time.perf_counter()
+    exec(code, {"__name__": "__main__", "__file__": str(path)})
+    return time.perf_counter() - t0
+
+
+def clear_caches(work):
+    for pattern in CACHE_PATTERNS:
+        for path in Path(work).rglob(pattern):
+            if path.is_dir():
+                shutil.rmtree(path)
+            elif path.exists():
+                path.unlink()
+
+
+def prepare_scale(root, n_games, seed):
+    """Cartella con i dati sintetici della scala (rigenerati solo se mancano) e i conteggi."""
+    work = Path(root) / f"scale_{n_games}"
+    manifest = work / "synthetic_manifest.json"
+    if manifest.exists():
+        with open(manifest, encoding="utf-8") as f:
+            counts = json.load(f)
+        if counts.get("n_games") == n_games and counts.get("seed") == seed:
+            return work, counts
+    if work.exists():
+        shutil.rmtree(work)
+    t0 = time.perf_counter()
+    counts = generate(work, n_games, seed)
+    print(f"Dati sintetici {work}: {counts} in {time.perf_counter() - t0:.1f}s")
+    (work / "analisi" / "output_analisi").mkdir(parents=True, exist_ok=True)
+    return work, counts
+
+
+def bench_stage(work, script, overrides):
+    """Esegue uno stage in un processo separato: (secondi, MB di picco, returncode)."""
+    env = dict(os.environ, MPLBACKEND="Agg",
+               PYTHONPATH=os.pathsep.join(filter(None, [str(CODE_DIR), os.environ.get("PYTHONPATH")])))
+    with open(Path(work) / f"{Path(script).stem}.log", "w", encoding="utf-8") as log:
+        proc = subprocess.run(
+            [sys.executable, str(Path(__file__).resolve()), "--stage", script, json.dumps(overrides)],
+            cwd=work, env=env, stdout=subprocess.PIPE, stderr=log, text=True,
+        )
+        log.write(proc.stdout)
+    result = {}
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith("BENCH "):
+            result = json.loads(line[len("BENCH "):])
+            break
+    return result.get("seconds"), result.get("peak_mb"), proc.returncode
+
+
+def stage_rows(work, counts, rows_key):
+    if rows_key.startswith("csv:"):
+        path = Path(work) / rows_key[len("csv:"):]
+        return count_rows(path) if path.exists() else None
+    return counts.get(rows_key)
+
+
+def run_benchmark(scales, seed=0, warm=False, root=bench_dir):
+    rows = []
+    for n_games in scales:
+        work, counts = prepare_scale(root, n_games, seed)
+        clear_caches(work)
+        for run in ["cold", "warm"] if warm else ["cold"]:
+            for stage, script, overrides, rows_key in STAGES:
+                n_rows = stage_rows(work, counts, rows_key)
+                seconds, peak_mb, code = bench_stage(work, script, overrides)
+                rows.append({
+                    "n_games": n_games,
+                    "run": run,
+                    "stage": stage,
+                    "rows": n_rows,
+                    "seconds": round(seconds, 3) if seconds is not None else None,
+                    "rows_per_s": round(n_rows / seconds) if n_rows and seconds else None,
+                    "peak_mb": round(peak_mb, 1) if peak_mb is not None else None,
+                    "status": "ok" if code == 0 else f"exit {code}",
+                })
+                print(f"{n_games:>9} {run:<4} {stage:<26} {rows[-1]['seconds']}s  {rows[-1]['rows_per_s']} righe/s  "
+                      f"{rows[-1]['peak_mb']} MB  {rows[-1]['status']}")
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--stage":
+        # processo figlio: un solo script, risultato su stdout
+        seconds = run_script(sys.argv[2], json.loads(sys.argv[3]))
+        print("BENCH " + json.dumps({"seconds": seconds, "peak_mb": peak_memory_mb()}))
+        sys.exit(0)
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark della pipeline su dati sintetici")
+    parser.add_argument("scales", nargs="*", type=lambda v: int(float(v)), default=scales,
+                        help="numero di partite per scala (es. 1e3 1e5)")
+    parser.add_argument("--warm", action="store_true", help="seconda run con le cache già costruite")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--dir", default=bench_dir, help="cartella dei dati sintetici")
+    args = parser.parse_args()
+
+    df = run_benchmark(args.scales, args.seed, args.warm, args.dir)
+    if not df.empty:
+        print(df.to_string(index=False))
+        df.to_csv(output_file, index=False)
+        print(f"Risultati salvati in {output_file}")
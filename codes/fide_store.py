@@ -0,0 +1,137 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from jsonl_reader import iter_jsonl, split_line_ranges
+from table_cache import atomic_output, cache_is_fresh, write_cache_meta
+
+# Archivio compatto dei rating FIDE, costruito una sola volta (in parallelo)
+# da fide_scraping_user.jsonl e salvato accanto al JSONL (.store.npz):
+# gli script ripartono dagli array senza rileggere né decodificare il JSON.
+# Come le altre cache è legato all'hash del contenuto del JSONL.
+#
+# Una riga per voce di RatingHistory con Period valido:
+#   occ:    indice dell'occorrenza utente (riga JSONL × utente) → user_ids[occ]
+#   month:  anno*12 + mese-1
+#   <control>_rating / <control>_games per standard, rapid, blitz (int32);
+#   rating mancante o non numerico = MISSING, partite mancanti o non
+#   numeriche = 0 (come faceva lo script 00)
+
+STORE_VERSION = 1
+CONTROLS = {"standard": "Standard", "rapid": "Rapid", "blitz": "Blitz"}
+MISSING = np.iinfo(np.int32).min
+INT32_MAX = np.iinfo(np.int32).max
+
+
+@lru_cache(maxsize=None)
+def period_to_month(period_str):
+    """'2024-Mar' → anno*12 + mese-1, None se non valido (memoizzata: i periodi distinti sono pochi)."""
+    try:
+        dt = datetime.strptime(period_str, "%Y-%b")
+    except Exception:
+        return None
+    return dt.year * 12 + dt.month - 1
+
+
+def _to_int(value):
+    if value is None:
+        return None
+    try:
+        n = int(str(value).strip())
+    except Exception:
+        return None
+    return n if -INT32_MAX <= n <= INT32_MAX else None
+
+
+def _ingest_range(jsonl_path, start, end):
+    """Worker: righe in [start, end) → array dell'archivio (occ locali allo shard)."""
+    user_ids = []
+    occ, month = [], []
+    cols = {f"{c}_{k}": [] for c in CONTROLS for k in ("rating", "games")}
+    for data in iter_jsonl(jsonl_path, start, end):
+        for user_id, user_info in data.items():
+            rating_history = user_info.get("FIDE_Profile", {}).get("RatingHistory", [])
+            if not isinstance(rating_history, list):
+                continue
+            k = len(user_ids)
+            user_ids.append(user_id)
+            for entry in rating_history:
+                m = period_to_month(entry.get("Period", ""))
+                if m is None:
+                    continue
+                occ.append(k)
+                month.append(m)
+                for control, key in CONTROLS.items():
+                    block = entry.get(key) or {}
+                    rating = _to_int(block.get("Rating"))
+                    games = _to_int(block.get("Games"))
+                    cols[f"{control}_rating"].append(MISSING if rating is None else rating)
+                    cols[f"{control}_games"].append(games or 0)
+    arrays = {"occ": np.array(occ, dtype=np.int64), "month": np.array(month, dtype=np.int32)}
+    arrays.update({name: np.array(values, dtype=np.int32) for name, values in cols.items()})
+    return user_ids, arrays
+
+
+def store_path(jsonl_path):
+    return Path(jsonl_path).with_suffix(".store.npz")
+
+
+def build_fide_store(jsonl_path, n_workers=1):
+    """Legge il JSONL (in parallelo con n_workers > 1) e restituisce l'archivio come dict di array."""
+    ranges = split_line_ranges(jsonl_path, max(1, n_workers) * 4)
+    if n_workers <= 1:
+        shards = [_ingest_range(jsonl_path, start, end) for start, end in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            shards = list(pool.map(_ingest_range, [jsonl_path] * len(ranges),
+                                   [r[0] for r in ranges], [r[1] for r in ranges]))
+
+    user_ids = []
+    parts = []
+    for shard_users, arrays in shards:  # gli shard sono in ordine di file
+        arrays["occ"] = arrays["occ"] + len(user_ids)
+        user_ids.extend(shard_users)
+        parts.append(arrays)
+    names = ["occ", "month"] + [f"{c}_{k}" for c in CONTROLS for k in ("rating", "games")]
+    store = {
+        name: np.concatenate([p[name] for p in parts]) if parts else np.zeros(0, dtype=np.int32)
+        for name in names
+    }
+    store["user_ids"] = np.array(user_ids, dtype=str)
+    return store
+
+
+def load_fide_store(jsonl_path, n_workers=1):
+    """Archivio dal file .store.npz accanto al JSONL, ricostruito solo se il JSONL è cambiato."""
+    path = store_path(jsonl_path)
+    meta_path = path.with_suffix(".meta.json")
+    fresh, fingerprints = cache_is_fresh(meta_path, [jsonl_path], STORE_VERSION)
+    if fresh and path.exists():
+        with np.load(path) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    print(f"Costruisco l'archivio dei rating {path} da {jsonl_path}")
+    store = build_fide_store(jsonl_path, n_workers)
+    with atomic_output(path, suffix=".npz") as tmp:
+        np.savez(tmp, **store)
+    write_cache_meta(meta_path, fingerprints, STORE_VERSION, entries=len(store["month"]), users=len(store["user_ids"]))
+    return store
+
+
+def control_entries(store, control):
+    """(occ, month, rating, games) delle sole voci con rating valido per il controllo."""
+    rating = store[f"{control}_rating"]
+    ok = rating != MISSING
+    return store["occ"][ok], store["month"][ok].astype(np.int64), rating[ok], store[f"{control}_games"][ok]
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    # Costruzione anticipata dell'archivio: python fide_store.py [fide_scraping_user.jsonl]
+    source = sys.argv[1] if len(sys.argv) > 1 else r"output\fide_scraping_user.jsonl"
+    load_fide_store(source, os.cpu_count() or 1)
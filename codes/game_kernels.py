@@ -0,0 +1,151 @@
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # senza numba la scansione delle eval usa solo NumPy
+    numba = None
+
+# Kernel a blocchi per i campi numerici di process_game: tempi per fase dai
+# clocks e prima semimossa in svantaggio dalle eval dell'analisi.
+# Lavorano su un blocco di partite alla volta, con le liste di ogni partita
+# concatenate in un solo array (ragged array):
+#   values  float64, clocks (o eval) di tutte le partite una dopo l'altra
+#   offsets int64, n_partite + 1: la partita g occupa values[offsets[g]:offsets[g + 1]]
+#   steps   int64, semimosse dell'utente: 0 bianco, 1 nero, -1 utente non trovato
+# Le eval mancanti (semimosse con "mate" o senza analisi) sono NaN.
+#
+# Con numba installato la scansione delle eval è un ciclo compilato per
+# partita con uscita anticipata; altrimenti un minimo progressivo NumPy su
+# tutto il blocco più una ricerca binaria per soglia. In entrambi i casi le
+# eval sono lette una sola volta qualunque sia il numero di soglie, e i
+# risultati sono identici.
+
+USE_NUMBA = numba is not None
+
+
+def ragged_from_lists(lists):
+    """(values, offsets) da una lista di liste (None o lista vuota = partita senza valori)."""
+    lengths = np.fromiter((len(x) if x else 0 for x in lists), dtype=np.int64, count=len(lists))
+    offsets = np.zeros(len(lists) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    values = np.fromiter(
+        (np.nan if v is None else v for x in lists if x for v in x),
+        dtype=np.float64, count=int(offsets[-1]),
+    )
+    return values, offsets
+
+
+def ragged_from_arrow(column):
+    """(values, offsets) da una colonna lista di pyarrow (null → NaN), senza passare da Python."""
+    if column.null_count:
+        column = column.fill_null([])
+    offsets = column.offsets.to_numpy().astype(np.int64)
+    values = column.values.to_numpy(zero_copy_only=False).astype(np.float64)
+    return values[offsets[0]:offsets[-1]], offsets - offsets[0]
+
+
+def _phase_bounds(lo, hi, steps):
+    """Prima e ultima semimossa dell'utente in [lo, hi) (first > last se nessuna)."""
+    first = lo + (steps - lo) % 2
+    last = hi - 1 - (hi - 1 - steps) % 2
+    return first, last
+
+
+def phase_clock_averages(values, offsets, steps, middle, end):
+    """
+    Tempo medio per mossa (secondi) dell'utente in apertura [0, middle),
+    mediogioco [middle, end) e finale [end, fine partita): tre array float64,
+    NaN dove la fase ha meno di due clock dell'utente.
+
+    La media delle differenze tra clock consecutivi di una fase è
+    (primo - ultimo) / (n - 1): serve solo il primo e l'ultimo clock
+    dell'utente nella fase, non le liste intermedie. Con clock interi
+    (centesimi di secondo, come lichess) il valore è identico a
+    sum(differenze) / len(differenze) / 100.
+    """
+    starts = offsets[:-1]
+    lengths = np.diff(offsets)
+    middle = np.minimum(np.maximum(middle, 0), lengths)
+    end = np.maximum(np.minimum(end, lengths), 0)
+    valid = steps >= 0
+    result = []
+    for lo, hi in [(np.zeros_like(lengths), middle), (middle, end), (end, lengths)]:
+        first, last = _phase_bounds(lo, hi, steps)
+        n = np.where(valid & (last > first), (last - first) // 2 + 1, 0)
+        ok = n >= 2
+        avg = np.full(len(lengths), np.nan)
+        avg[ok] = (values[starts[ok] + first[ok]] - values[starts[ok] + last[ok]]) / (n[ok] - 1) / 100
+        result.append(avg)
+    return tuple(result)
+
+
+def _first_disadvantage_loop(values, offsets, steps, thresholds, out):
+    # soglie crescenti: il peggior eval finora le supera in ordine
+    for g in range(len(steps)):
+        step = steps[g]
+        if step < 0:
+            continue
+        sign = 1.0 if step == 0 else -1.0
+        start = offsets[g]
+        worst = np.inf
+        k = 0
+        for i in range(step, offsets[g + 1] - start, 2):
+            v = values[start + i] * sign
+            if v < worst:  # falso per NaN: semimossa senza eval
+                worst = v
+                while k < len(thresholds) and worst <= -thresholds[k]:
+                    out[g, k] = i
+                    k += 1
+                if k == len(thresholds):
+                    break
+
+
+if numba is not None:
+    _first_disadvantage_loop = numba.njit(cache=True)(_first_disadvantage_loop)
+
+
+def _first_disadvantage_numpy(values, offsets, steps, thresholds, out):
+    # solo le semimosse dell'utente, eval col segno dal suo punto di vista
+    lengths = np.diff(offsets)
+    game = np.repeat(np.arange(len(steps)), lengths)
+    local = np.arange(len(values)) - offsets[:-1][game]
+    game_steps = steps[game]
+    user = np.flatnonzero((game_steps >= 0) & ((local - game_steps) % 2 == 0))
+    if not len(user):
+        return
+    game, local = game[user], local[user]
+    signed = np.where(steps[game] == 1, -values[user], values[user])
+
+    # peggior eval finora di ogni partita con un solo minimo progressivo su
+    # tutto il blocco: ogni partita è spostata di `gap` sotto le precedenti,
+    # così il minimo non attraversa i confini e l'array resta decrescente
+    finite = np.isfinite(signed)
+    span = np.abs(signed[finite]).max() if finite.any() else 0.0
+    gap = 2 * span + np.abs(thresholds).max() + 1
+    worst = np.minimum.accumulate(np.where(finite, signed, np.inf) - game * gap)
+
+    # prima semimossa con worst <= -(soglia + g * gap), se cade nella partita g
+    games = np.unique(game)
+    pos = np.searchsorted(-worst, thresholds[None, :] + (games * gap)[:, None])
+    inside = pos < len(worst)
+    pos = np.where(inside, pos, 0)
+    rows, cols = np.nonzero(inside & (game[pos] == games[:, None]))
+    out[games[rows], cols] = local[pos[rows, cols]]
+
+
+def first_disadvantage(values, offsets, steps, thresholds):
+    """
+    Per ogni partita e soglia (centipedoni) la prima semimossa dell'utente con
+    eval a suo sfavore di almeno la soglia (bianco: eval <= -soglia, nero:
+    eval >= soglia): array int64 (n_partite, n_soglie), -1 se mai raggiunta.
+    Tutte le soglie in un solo passaggio per partita sul peggior eval finora.
+    """
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    out = np.full((len(steps), len(thresholds)), -1, dtype=np.int64)
+    if len(steps) and len(thresholds):
+        order = np.argsort(thresholds, kind="stable")
+        kernel = _first_disadvantage_loop if USE_NUMBA else _first_disadvantage_numpy
+        found = np.full_like(out, -1)
+        kernel(values, offsets, steps, thresholds[order], found)
+        out[:, order] = found
+    return out
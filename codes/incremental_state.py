@@ -0,0 +1,85 @@
+import hashlib
+import os
+import pickle
+
+from table_cache import atomic_output
+
+# Stato per la modalità incrementale degli script che aggregano i JSONL grezzi.
+# Si salva (pickle) l'aggregato parziale insieme, per ogni file sorgente, al
+# byte fino a cui è stato letto: alla run successiva si leggono solo i byte
+# aggiunti in coda e i file nuovi, poi si fonde col vecchio aggregato.
+#
+# Presupposti: i sorgenti crescono solo per append di righe complete e le
+# righe nuove non ripetono record già letti. Se un file già letto risulta
+# riscritto (più corto, o con inizio/fine della parte letta diversi), se
+# sparisce dall'elenco o se cambia la firma dell'aggregazione, lo stato
+# viene scartato e si ricalcola tutto.
+
+STATE_VERSION = 1
+CHECK_BYTES = 64 * 1024
+
+
+def _prefix_check(path, offset):
+    """Hash dei primi e degli ultimi CHECK_BYTES della parte [0, offset) del file."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        h.update(f.read(min(CHECK_BYTES, offset)))
+        f.seek(max(0, offset - CHECK_BYTES))
+        h.update(f.read(offset - f.tell()))
+    return h.hexdigest()
+
+
+def load_state(state_path, signature):
+    """Stato salvato in state_path se compatibile con `signature`, altrimenti None."""
+    try:
+        with open(state_path, "rb") as f:
+            state = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+    if state.get("version") != STATE_VERSION or state.get("signature") != signature:
+        print(f"Stato incrementale {state_path} non compatibile, ricalcolo completo")
+        return None
+    return state
+
+
+def pending_ranges(state, paths):
+    """
+    [(file, start, end)] ancora da leggere: la coda aggiunta ai file già letti
+    e i file nuovi per intero. None se lo stato non è riusabile (ricalcolo completo).
+    """
+    sources = {} if state is None else state["sources"]
+    if state is not None and not set(sources) <= {str(p) for p in paths}:
+        print("Un file già letto non è più tra i sorgenti, ricalcolo completo")
+        return None
+
+    ranges = []
+    for path in paths:
+        size = os.path.getsize(path)
+        done = sources.get(str(path))
+        if done is None:
+            start = 0
+        elif size < done["offset"] or _prefix_check(path, done["offset"]) != done["check"]:
+            print(f"{path} è stato riscritto, ricalcolo completo")
+            return None
+        else:
+            start = done["offset"]
+        if start < size:
+            ranges.append((path, start, size))
+    return ranges
+
+
+def save_state(state_path, signature, paths, data, ranges, previous=None):
+    """Salva `data` ricordando per ogni sorgente il byte fino a cui è stato letto."""
+    sources = dict(previous["sources"]) if previous else {}
+    for path, _, end in ranges:
+        sources[str(path)] = {"offset": end, "check": _prefix_check(path, end)}
+    for path in paths:  # file vuoti o senza dati nuovi già presenti restano invariati
+        sources.setdefault(str(path), {"offset": 0, "check": _prefix_check(path, 0)})
+
+    with atomic_output(state_path) as tmp:
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                {"version": STATE_VERSION, "signature": signature, "sources": sources, "data": data},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
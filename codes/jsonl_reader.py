@@ -0,0 +1,113 @@
+import json
+import os
+
+# Lettore JSONL condiviso da tutti gli script.
+# - decoder: orjson o msgspec se installati (molto più veloci), altrimenti json
+#   della libreria standard; si può forzare con la variabile JSONL_DECODER.
+# - il file è letto in binario a blocchi grandi e spezzato in righe in memoria,
+#   senza decodifica UTF-8 preventiva (i decoder accettano direttamente bytes).
+
+READ_BLOCK = 16 * 1024 * 1024
+
+
+def _stdlib_decoder():
+    return json.loads, (json.JSONDecodeError, UnicodeDecodeError)
+
+
+def _orjson_decoder():
+    import orjson
+    return orjson.loads, (orjson.JSONDecodeError, UnicodeDecodeError)
+
+
+def _msgspec_decoder():
+    import msgspec
+    return msgspec.json.Decoder().decode, (msgspec.DecodeError, UnicodeDecodeError)
+
+
+DECODERS = {
+    "orjson": _orjson_decoder,
+    "msgspec": _msgspec_decoder,
+    "json": _stdlib_decoder,
+}
+
+
+def get_decoder(name=None):
+    """
+    (nome, loads, eccezioni di decodifica) per il backend richiesto;
+    senza nome: il primo disponibile in ordine orjson → msgspec → json.
+    """
+    names = [name] if name else list(DECODERS)
+    for candidate in names:
+        try:
+            loads, errors = DECODERS[candidate]()
+        except ImportError:
+            continue
+        return candidate, loads, errors
+    raise ImportError(f"decoder JSON non disponibile: {name}")
+
+
+BACKEND, loads, DECODE_ERRORS = get_decoder(os.environ.get("JSONL_DECODER") or None)
+
+
+def split_line_ranges(jsonl_path, n_shards, start=0, end=None):
+    """
+    Divide [start, end) (default: tutto il file) in n_shards intervalli di
+    byte allineati a inizio riga; start deve essere già un inizio riga.
+    """
+    if end is None:
+        end = os.path.getsize(jsonl_path)
+    bounds = [start]
+    with open(jsonl_path, "rb") as f:
+        for k in range(1, n_shards):
+            f.seek(start + (end - start) * k // n_shards)
+            f.readline()  # avanza fino all'inizio della riga successiva
+            pos = min(f.tell(), end)
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    if bounds[-1] < end:
+        bounds.append(end)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def iter_lines(path, start=0, end=None):
+    """
+    (offset, riga) per ogni riga che inizia in [start, end), riga in bytes senza
+    spazi iniziali/finali (le righe vuote sono restituite come b"").
+    """
+    if end is None:
+        end = os.path.getsize(path)
+    with open(path, "rb", buffering=0) as f:
+        f.seek(start)
+        pos = start
+        tail = b""
+        while pos < end:
+            block = f.read(READ_BLOCK)
+            if not block:
+                break
+            lines = (tail + block).split(b"\n")
+            tail = lines.pop()
+            for line in lines:
+                if pos >= end:
+                    return
+                yield pos, line.strip()
+                pos += len(line) + 1
+        if tail and pos < end:
+            yield pos, tail.strip()
+
+
+def iter_jsonl(path, start=0, end=None, skip_invalid=False):
+    """
+    Oggetti JSON delle righe non vuote. Con skip_invalid=True le righe non
+    decodificabili vengono segnalate e saltate, altrimenti l'errore si propaga.
+    """
+    for offset, line in iter_lines(path, start, end):
+        if not line:
+            continue
+        try:
+            obj = loads(line)
+        except DECODE_ERRORS:
+            if not skip_invalid:
+                raise
+            print(f"Riga all'offset {offset} non valida, salto")
+            continue
+        yield obj
@@ -0,0 +1,80 @@
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+
+# Date delle rating_history Lichess: chiavi "G-M-AAAA" con mese in base 0
+# (0 → gennaio, ..., 11 → dicembre). Se il giorno non esiste nel mese
+# (es. 31-1-2023 → 31 febbraio) si usa l'ultimo giorno valido del mese.
+#
+# Le stesse chiavi si ripetono per milioni di utenti × game_type, quindi il
+# parsing è memoizzato: ogni chiave distinta viene interpretata una volta sola.
+
+NAT = np.datetime64("NaT", "D")
+_NAT_DAYS = NAT.view(np.int64)
+
+
+@lru_cache(maxsize=None)
+def parse_date_shifted(date_str: str):
+    """
+    Converte stringhe tipo '1-0-2023' in date reali (datetime), None se la
+    data non è valida. Memoizzata.
+    """
+    parts = date_str.split("-")
+    if len(parts) != 3:
+        return None
+
+    day, month, year = map(int, parts)
+    month += 1  # correzione da base 0 a base 1
+
+    if month > 12:
+        return None  # mese non valido
+
+    while True:
+        try:
+            return datetime(year, month, day)
+        except ValueError:
+            day -= 1
+            if day <= 0:
+                return None
+
+
+# chiave → giorni dal 1970-01-01 (o il valore intero di NaT)
+_DAYS_CACHE = {}
+
+
+def _split_key(date_str):
+    parts = date_str.split("-")
+    if len(parts) != 3:
+        return 0, 0, 0
+    try:
+        return tuple(int(p) for p in parts)
+    except ValueError:
+        return 0, 0, 0
+
+
+def _parse_days(keys):
+    """Giorni dal 1970-01-01 per una lista di chiavi nuove, in blocco."""
+    parts = np.array([_split_key(k) for k in keys], dtype=np.int64).reshape(-1, 3)
+    day, month, year = parts[:, 0], parts[:, 1] + 1, parts[:, 2]
+    valid = (day >= 1) & (month >= 1) & (month <= 12) & (year >= 1) & (year <= 9999)
+
+    first = ((year - 1970) * 12 + month - 1).astype("datetime64[M]")
+    first_day = first.astype("datetime64[D]")
+    days_in_month = ((first + 1).astype("datetime64[D]") - first_day).astype(np.int64)
+    dates = first_day + (np.minimum(day, days_in_month) - 1)
+    return np.where(valid, dates.view(np.int64), _NAT_DAYS)
+
+
+def parse_dates_shifted(date_keys):
+    """
+    Array datetime64[D] per una lista di chiavi "G-M-AAAA" (stessa logica di
+    parse_date_shifted), NaT per le chiavi non valide. Le chiavi mai viste
+    sono interpretate tutte insieme e poi tenute in cache.
+    """
+    keys = list(date_keys)
+    missing = [k for k in set(keys) if k not in _DAYS_CACHE]
+    if missing:
+        _DAYS_CACHE.update(zip(missing, _parse_days(missing).tolist()))
+    days = np.fromiter((_DAYS_CACHE[k] for k in keys), dtype=np.int64, count=len(keys))
+    return days.view("datetime64[D]")
@@ -0,0 +1,620 @@
+import numpy as np
+import pandas as pd
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from incremental_state import load_state, pending_ranges, save_state
+from jsonl_reader import DECODE_ERRORS, iter_lines, loads, split_line_ranges
+from game_kernels import first_disadvantage, phase_clock_averages, ragged_from_arrow, ragged_from_lists
+from lichess_games_table import ensure_games_table, iter_detail_batches, table_parts
+from metrics import RUN_METRICS, add_metric, merge_metrics, progress_reporter, timed
+from opening_trie import load_opening_trie, match_opening
+from table_cache import source_fingerprint
+
+# Motore condiviso per le statistiche per partita di lichess_games_matched.jsonl:
+# il file viene letto e process_game eseguito UNA sola volta per partita,
+# poi i record vengono aggregati per ogni raggruppamento registrato.
+
+# Versione della logica di process_game: incrementarla quando cambia il modo
+# di calcolare i record, così gli stati incrementali salvati vengono scartati.
+STATS_VERSION = 2
+
+# Soglie (centipedoni) dei campi *_disadvantage_<soglia> dei record
+DISADVANTAGE_THRESHOLDS = [150, 200]
+
+# Soglie (centipedoni) della curva di svantaggio: conteggi per soglia in
+# formato lungo (vedi finalize_sweep), calcolati solo con
+# scan_games(sweep=True), insieme alle soglie sopra e con una sola
+# scansione delle eval per partita
+SWEEP_THRESHOLDS = list(range(50, 501, 50))
+SWEEP_COLUMNS = [
+    "tot_matches_disadvantage",
+    "wins_from_disadvantage",
+    "wins_from_disadvantage_outoftime",
+    "draws_from_disadvantage",
+    "moves_after_disadvantage",
+]
+
+# Partite per blocco passato a process_games nella lettura del JSONL
+# (la tabella per partita è già letta a blocchi di ROWS_PER_BATCH)
+GAMES_PER_CHUNK = 4096
+
+# Raggruppamenti: nome → chiavi di groupby (e di merge col CSV dei percentili)
+GROUPINGS = {
+    "global": ["user_id", "game_type"],
+    "monthly": ["user_id", "game_type", "month"],
+}
+
+# Specifica di aggregazione: colonna output → (colonna record, funzione)
+AGG_SPEC = {
+    "unique_eco": ("eco", "nunique"),
+    "ply_theoretical_avg": ("ply_theoretical", "mean"),
+    "opening_gap_avg": ("opening_gap", "mean"),
+    "opening_gap_above_7_ply_avg": ("opening_gap_above_7_ply", "mean"),
+    "theory_depth_avg": ("theory_depth", "mean"),
+    "inaccuracy_avg": ("inaccuracy_avg", "mean"),
+    "mistake_avg": ("mistake_avg", "mean"),
+    "blunder_avg": ("blunder_avg", "mean"),
+    "acpl_avg": ("acpl_avg", "mean"),
+    "accuracy_avg": ("accuracy_avg", "mean"),
+    "diff_opponent_avg": ("diff_opponent", "mean"),
+    "avg_time_opening": ("avg_time_opening", "mean"),
+    "avg_time_middle": ("avg_time_middle", "mean"),
+    "avg_time_end": ("avg_time_end", "mean"),
+    "wins_from_disadvantage_150": ("wins_from_disadvantage_150", "sum"),
+    "wins_from_disadvantage_150_outoftime": ("wins_from_disadvantage_150_outoftime", "sum"),
+    "wins_from_disadvantage_200": ("wins_from_disadvantage_200", "sum"),
+    "wins_from_disadvantage_200_outoftime": ("wins_from_disadvantage_200_outoftime", "sum"),
+    "draws_from_disadvantage_150": ("draws_from_disadvantage_150", "sum"),
+    "moves_after_disadvantage_150": ("moves_after_disadvantage_150", "mean"),
+    "moves_after_disadvantage_200": ("moves_after_disadvantage_200", "mean"),
+    "tot_resigned": ("user_resigned", "sum"),
+    "tot_matches_disadvantage_150": ("tot_matches_disadvantage_150", "sum"),
+    "tot_matches_disadvantage_200": ("tot_matches_disadvantage_200", "sum"),
+    "tot_matches": ("tot_matches", "sum"),
+}
+
+
+def register_grouping(name, keys):
+    """Registra un nuovo raggruppamento (le chiavi devono essere campi del record)."""
+    GROUPINGS[name] = list(keys)
+
+
+def _sweep_thresholds():
+    return sorted(set(SWEEP_THRESHOLDS))
+
+
+# --- FUNZIONE: campi per partita che non dipendono da clocks e analisi ---
+def _game_fields(detail, username, opening_trie):
+    """(record senza tempi e svantaggi, step, middle, end, colore, vincitore, status) o None."""
+    try:
+        created_at = detail.get("createdAt")
+        if not created_at:
+            return None
+        date = datetime.utcfromtimestamp(created_at / 1000)
+        month = date.strftime("%Y-%m")
+
+        user_id = detail.get('username') or username
+        if not user_id:
+            return None
+        game_type = detail.get("speed", "unknown").lower()
+
+        eco = None
+        ply_theoretical = None
+        opening_name = None
+        if "opening" in detail and isinstance(detail["opening"], dict):
+            eco = detail["opening"].get("eco")
+            ply_theoretical = detail["opening"].get("ply")
+            opening_name = detail["opening"].get("name")
+
+        # Mosse giocate
+        game_moves_str = detail.get("moves", "")
+        game_moves_list = [m for m in game_moves_str.split() if m.strip() != ""]
+
+        # Calcolo opening_gap (rispetto all'apertura etichettata) e
+        # profondità della linea teorica più lunga seguita dalla partita
+        opening_gap, deepest_line = match_opening(opening_trie, game_moves_list, opening_name, ply_theoretical)
+        opening_gap_above_7_ply = None
+        if opening_gap is not None and ply_theoretical > 7:
+            opening_gap_above_7_ply = opening_gap
+        theory_depth = deepest_line[2] if deepest_line else 0
+
+        # --- Analisi giocatore ---
+        analysis_data = None
+        user_rating = None
+        user_color = None
+        user_resigned = False
+        step = -1
+        opponent_rating = None
+        winner = detail.get('winner', 'draw')
+        division = detail.get('division', {})
+        middle = division.get("middle", 20)
+        end = division.get("end", 40)
+
+        if "players" in detail:
+            for color in ["white", "black"]:
+                player = detail["players"].get(color, {})
+                user = player.get("user", {})
+                if user and user.get("id") == user_id.lower():
+                    analysis_data = player.get("analysis", {})
+                    user_rating = player.get("rating")
+                    user_color = color
+                    step = 0 if user_color == 'white' else 1
+                else:
+                    opponent_rating = player.get("rating") if player.get("rating") else None
+
+        if detail.get("status") == "resign" and user_color and user_color != winner:
+            user_resigned = True
+
+        if analysis_data:
+            inaccuracy_avg = analysis_data.get("inaccuracy")
+            mistake_avg = analysis_data.get("mistake")
+            blunder_avg = analysis_data.get("blunder")
+            acpl_avg = analysis_data.get("acpl")
+            accuracy_avg = analysis_data.get("accuracy")
+        else:
+            inaccuracy_avg = mistake_avg = blunder_avg = acpl_avg = accuracy_avg = None
+
+        diff_opponent = None
+        if user_rating is not None and opponent_rating is not None:
+            diff_opponent = user_rating - opponent_rating
+
+        rec = {
+            "user_id": user_id,
+            "game_type": game_type,
+            "month": month,
+            "eco": eco,
+            "opening_name": opening_name,
+            "ply_theoretical": ply_theoretical,
+            "opening_gap": opening_gap,
+            "opening_gap_above_7_ply": opening_gap_above_7_ply,
+            "theory_depth": theory_depth,
+            "inaccuracy_avg": inaccuracy_avg,
+            "mistake_avg": mistake_avg,
+            "blunder_avg": blunder_avg,
+            "acpl_avg": acpl_avg,
+            "accuracy_avg": accuracy_avg,
+            "diff_opponent": diff_opponent,
+            "user_resigned": 1 if user_resigned else 0,
+            "tot_matches": 1
+        }
+        return rec, step, middle, end, user_color, winner, detail.get("status")
+    except Exception as e:
+        print(f"Errore parsing game: {e}")
+        return None
+
+
+def _analysis_evals(analysis):
+    """Eval per semimossa dell'analisi lichess (None dove manca, es. "mate")."""
+    return [a.get("eval") if isinstance(a, dict) else None for a in analysis or []]
+
+
+# --- FUNZIONE: processa un blocco di game JSON (dettagli) ---
+def process_games(games, opening_trie, clocks=None, evals=None, sweep_thresholds=None):
+    """
+    Record (o None) per ogni (username, dettaglio) di `games`. I campi per
+    partita sono calcolati in Python; tempi medi per fase e svantaggi con i
+    kernel di game_kernels.py su tutto il blocco. clocks ed evals sono
+    (values, offsets) già concatenati (es. dalla tabella per partita); se
+    None vengono presi dai dettagli. Con sweep_thresholds (crescenti) i
+    record hanno anche il campo "disadvantage_sweep" per la curva di
+    svantaggio, calcolato nella stessa scansione delle eval.
+    """
+    games = list(games)
+    fields = [_game_fields(detail, username, opening_trie) for username, detail in games]
+    if clocks is None:
+        clocks = ragged_from_lists([detail.get("clocks") for _, detail in games])
+    if evals is None:
+        evals = ragged_from_lists([_analysis_evals(detail.get("analysis")) for _, detail in games])
+
+    # partite scartate: step -1, i kernel le saltano
+    steps = np.array([f[1] if f else -1 for f in fields], dtype=np.int64)
+    middle = np.array([f[2] if f and f[2] is not None else 20 for f in fields], dtype=np.int64)
+    end = np.array([f[3] if f and f[3] is not None else 40 for f in fields], dtype=np.int64)
+    avg_times = [avg.tolist() for avg in phase_clock_averages(*clocks, steps, middle, end)]
+    # le soglie della curva già tra DISADVANTAGE_THRESHOLDS riusano la loro colonna
+    sweep_thresholds = list(sweep_thresholds or [])
+    thresholds = DISADVANTAGE_THRESHOLDS + [t for t in sweep_thresholds if t not in DISADVANTAGE_THRESHOLDS]
+    sweep_cols = [thresholds.index(t) for t in sweep_thresholds]
+    first_idx = first_disadvantage(*evals, steps, thresholds).tolist()
+    n_evals = np.diff(evals[1]).tolist()
+
+    records = []
+    for g, f in enumerate(fields):
+        if f is None:
+            records.append(None)
+            continue
+        rec, step, _, _, user_color, winner, status = f
+        for col, values in zip(["avg_time_opening", "avg_time_middle", "avg_time_end"], avg_times):
+            rec[col] = None if values[g] != values[g] else values[g]  # NaN: meno di due clock nella fase
+        total_user_moves = max(0, (n_evals[g] - step + 1) // 2)
+        game_idx = first_idx[g]
+        for threshold, idx in zip(DISADVANTAGE_THRESHOLDS, game_idx):
+            found = idx >= 0
+            # vittorie (e patte) da svantaggio >= threshold cp
+            won = found and user_color == winner
+            rec[f"wins_from_disadvantage_{threshold}"] = 1 if won else 0
+            rec[f"wins_from_disadvantage_{threshold}_outoftime"] = 1 if won and status == 'outoftime' else 0
+            rec[f"draws_from_disadvantage_{threshold}"] = 1 if found and winner == 'draw' else 0
+            rec[f"moves_after_disadvantage_{threshold}"] = total_user_moves - ((idx - step) // 2 + 1) if found else None
+            rec[f"tot_matches_disadvantage_{threshold}"] = 1 if found else 0
+        if sweep_thresholds:
+            # curva: (vinta, vinta per tempo, patta, mosse dopo lo svantaggio
+            # per ogni soglia raggiunta); le soglie sono crescenti e chi
+            # raggiunge una soglia ha raggiunto anche le precedenti
+            moves_after = [
+                total_user_moves - ((idx - step) // 2 + 1)
+                for idx in (game_idx[col] for col in sweep_cols) if idx >= 0
+            ]
+            rec["disadvantage_sweep"] = None
+            if moves_after:
+                won = user_color == winner
+                rec["disadvantage_sweep"] = (int(won), int(won and status == 'outoftime'), int(winner == 'draw'), moves_after)
+        records.append(rec)
+    return records
+
+
+# --- FUNZIONE: processa un singolo game JSON (dettaglio) ---
+def process_game(detail, username, opening_trie):
+    return process_games([(username, detail)], opening_trie)[0]
+
+
+# --- AGGREGATI PARZIALI (fondibili tra shard) ---
+# I record di process_game non vengono mai accumulati in lista: ognuno aggiorna
+# subito gli stati dei suoi gruppi e viene scartato, quindi la memoria cresce
+# con (utenti × game_type × mesi) e non col numero di partite.
+# Per ogni gruppo si tiene uno stato per colonna di AGG_SPEC:
+#   sum     → intero
+#   mean    → [conteggio non nulli, somme parziali esatte]
+#   nunique → insieme dei valori non nulli
+# Solo con la curva di svantaggio attiva, in fondo allo stato i suoi
+# conteggi: per ogni soglia (crescenti) partite, vittorie, vittorie per
+# tempo, patte e somma delle mosse dopo lo svantaggio, tutti interi.
+# Le somme dei float sono tenute come somme parziali non sovrapposte
+# (Shewchuk, la stessa tecnica di math.fsum): il risultato non dipende
+# dall'ordine né dalla suddivisione in shard, quindi seriale e parallelo
+# producono esattamente lo stesso CSV.
+
+def _add_exact(partials, x):
+    i = 0
+    for y in partials:
+        if abs(x) < abs(y):
+            x, y = y, x
+        hi = x + y
+        lo = y - (hi - x)
+        if lo:
+            partials[i] = lo
+            i += 1
+        x = hi
+    partials[i:] = [x]
+
+
+def _new_state(sweep_width=0):
+    state = []
+    for _, func in AGG_SPEC.values():
+        if func == "sum":
+            state.append(0)
+        elif func == "mean":
+            state.append([0, []])
+        else:
+            state.append(set())
+    if sweep_width:
+        state.append([0] * sweep_width)
+    return state
+
+
+def _update_state(state, rec):
+    for j, (col, func) in enumerate(AGG_SPEC.values()):
+        value = rec.get(col)
+        if value is None:
+            continue
+        if func == "sum":
+            state[j] += value
+        elif func == "mean":
+            state[j][0] += 1
+            _add_exact(state[j][1], float(value))
+        else:
+            state[j].add(value)
+    sweep = rec.get("disadvantage_sweep")
+    if sweep:
+        won, won_outoftime, draw, moves_after = sweep
+        counts = state[-1]
+        for j, moves in zip(range(0, len(counts), len(SWEEP_COLUMNS)), moves_after):
+            counts[j] += 1
+            counts[j + 1] += won
+            counts[j + 2] += won_outoftime
+            counts[j + 3] += draw
+            counts[j + 4] += moves
+
+
+def _merge_state(state, other):
+    for j, (_, func) in enumerate(AGG_SPEC.values()):
+        if func == "sum":
+            state[j] += other[j]
+        elif func == "mean":
+            state[j][0] += other[j][0]
+            for x in other[j][1]:
+                _add_exact(state[j][1], x)
+        else:
+            state[j] |= other[j]
+    if len(state) > len(AGG_SPEC):
+        state[-1] = [a + b for a, b in zip(state[-1], other[-1])]
+
+
+def accumulate_record(partials, rec, sweep_width=0):
+    """
+    Aggiorna in streaming gli stati {raggruppamento: {chiave: stato}} con un
+    record; sweep_width = len(SWEEP_COLUMNS) × soglie della curva (0 = senza).
+    """
+    for name, groups in partials.items():
+        key = tuple(rec[k] for k in GROUPINGS[name])
+        state = groups.get(key)
+        if state is None:
+            state = groups[key] = _new_state(sweep_width)
+        _update_state(state, rec)
+
+
+def merge_partials(partials, other):
+    """Fonde gli aggregati parziali `other` dentro `partials`."""
+    for name, groups in other.items():
+        target = partials.setdefault(name, {})
+        for key, state in groups.items():
+            if key in target:
+                _merge_state(target[key], state)
+            else:
+                target[key] = state
+    return partials
+
+
+def finalize_partials(groups, keys):
+    """Stati per gruppo → DataFrame con le stesse colonne di groupby().agg(**AGG_SPEC)."""
+    rows = []
+    for key in sorted(groups):
+        state = groups[key]
+        row = dict(zip(keys, key))
+        for j, (out_col, (_, func)) in enumerate(AGG_SPEC.items()):
+            if func == "sum":
+                row[out_col] = state[j]
+            elif func == "mean":
+                count, partials = state[j]
+                row[out_col] = math.fsum(partials) / count if count else float("nan")
+            else:
+                row[out_col] = len(state[j])
+        rows.append(row)
+    return pd.DataFrame(rows, columns=list(keys) + list(AGG_SPEC))
+
+
+def finalize_sweep(groups, keys, thresholds):
+    """
+    Stati per gruppo → curva di svantaggio in formato lungo: una riga per
+    gruppo e soglia con le partite totali e i conteggi di SWEEP_COLUMNS
+    (moves_after_disadvantage è la media). Alle soglie 150 e 200 i valori
+    coincidono con le colonne *_disadvantage_150/200 di finalize_partials.
+    thresholds: le soglie crescenti con cui sono stati accumulati gli stati.
+    """
+    tot_matches = list(AGG_SPEC).index("tot_matches")
+    width = len(SWEEP_COLUMNS)
+    rows = []
+    for key in sorted(groups):
+        state = groups[key]
+        counts = state[-1]
+        for k, threshold in enumerate(thresholds):
+            n, wins, wins_outoftime, draws, moves = counts[k * width:(k + 1) * width]
+            rows.append((*key, threshold, state[tot_matches], n, wins, wins_outoftime, draws,
+                         moves / n if n else float("nan")))
+    return pd.DataFrame(rows, columns=list(keys) + ["threshold", "tot_matches"] + SWEEP_COLUMNS)
+
+
+# --- SCANSIONE (JSONL grezzo o tabella per partita) ---
+# I worker restituiscono (aggregati parziali, metriche delle fasi): read,
+# decode (falliti = righe non decodificabili), process_game (falliti =
+# partite senza record) e aggregate (vedi metrics.py). Le partite passano a
+# process_games a blocchi (GAMES_PER_CHUNK dal JSONL, un batch Parquet dalla
+# tabella). L'avanzamento è stampato al più ogni metrics.PROGRESS_EVERY
+# secondi per shard.
+def _iter_details(obj):
+    """(username, dettaglio partita) di una riga JSONL."""
+    for username, games_list in obj.items():
+        for g in games_list:
+            for detail in g.get("details", []):
+                yield username, detail
+
+
+def _accumulate_games(games, opening_trie, partials, metrics, sweep_thresholds, clocks=None, evals=None):
+    """process_games su un blocco di (username, dettaglio) + accumulate_record, con i tempi per fase."""
+    clock = time.perf_counter
+    sweep_width = len(SWEEP_COLUMNS) * len(sweep_thresholds)
+    t = clock()
+    records = process_games(games, opening_trie, clocks, evals, sweep_thresholds)
+    now = clock()
+    records = [rec for rec in records if rec]
+    add_metric(metrics, "process_game", now - t, len(games), len(games) - len(records))
+    for rec in records:
+        accumulate_record(partials, rec, sweep_width)
+    add_metric(metrics, "aggregate", clock() - now, len(records))
+
+
+def _scan_range(jsonl_path, start, end, openings_path, groupings, sweep_thresholds):
+    """Worker: processa le righe in [start, end) e restituisce (aggregati parziali, metriche)."""
+    opening_trie = load_opening_trie(openings_path)
+    shard = f"[byte {start}] " if start else ""
+    progress = progress_reporter(f"{shard}{os.path.basename(jsonl_path)}:", total=end - start)
+    clock = time.perf_counter
+
+    partials = {name: {} for name in groupings}
+    metrics = {}
+    chunk = []  # partite in attesa del prossimo blocco
+    t = clock()
+    for offset, line in iter_lines(jsonl_path, start, end):
+        now = clock()
+        add_metric(metrics, "read", now - t, 1)
+        if line:
+            try:
+                obj = loads(line)
+            except DECODE_ERRORS:
+                add_metric(metrics, "decode", clock() - now, 1, 1)
+            else:
+                add_metric(metrics, "decode", clock() - now, 1)
+                chunk.extend(_iter_details(obj))
+                if len(chunk) >= GAMES_PER_CHUNK:
+                    _accumulate_games(chunk, opening_trie, partials, metrics, sweep_thresholds)
+                    chunk = []
+        progress(1, offset - start)
+        t = clock()
+    if chunk:
+        _accumulate_games(chunk, opening_trie, partials, metrics, sweep_thresholds)
+
+    return partials, metrics
+
+
+def _scan_table_part(part_path, openings_path, groupings, sweep_thresholds):
+    """Worker: come _scan_range ma su un file della tabella per partita (niente parsing JSON)."""
+    opening_trie = load_opening_trie(openings_path)
+    progress = progress_reporter(f"{os.path.basename(part_path)}:")
+    clock = time.perf_counter
+
+    partials = {name: {} for name in groupings}
+    metrics = {}
+    t = clock()
+    for games, clocks, evals in iter_detail_batches(part_path):
+        now = clock()
+        add_metric(metrics, "read", now - t, len(games))
+        clocks, evals = ragged_from_arrow(clocks), ragged_from_arrow(evals)
+        t = clock()
+        add_metric(metrics, "decode", t - now, len(games))
+        _accumulate_games(games, opening_trie, partials, metrics, sweep_thresholds, clocks, evals)
+        progress(len(games))
+        t = clock()
+    return partials, metrics
+
+
+def _range_tasks(ranges, openings_path, groupings, n_workers, sweep_thresholds):
+    tasks = []
+    for path, start, end in ranges:
+        if n_workers <= 1:
+            tasks.append((_scan_range, path, start, end, openings_path, groupings, sweep_thresholds))
+        else:
+            # più shard che worker per bilanciare righe di lunghezza molto diversa
+            tasks.extend(
+                (_scan_range, path, s, e, openings_path, groupings, sweep_thresholds)
+                for s, e in split_line_ranges(path, n_workers * 4, start, end)
+            )
+    return tasks
+
+
+def _state_signature(openings_path, groupings, sweep_thresholds):
+    # lo stato vale solo con la stessa aggregazione e lo stesso TSV delle aperture
+    return (
+        STATS_VERSION,
+        list(AGG_SPEC.items()),
+        sweep_thresholds,
+        [(name, GROUPINGS[name]) for name in groupings],
+        source_fingerprint(openings_path)["hash"],
+    )
+
+
+def scan_games(jsonl_path, openings_path, groupings=None, n_workers=1, use_table=True, state_path=None, sweep=False):
+    """
+    Legge il JSONL delle partite una sola volta e restituisce
+    {nome raggruppamento: DataFrame aggregato} per ogni raggruppamento richiesto
+    (default: tutti quelli registrati in GROUPINGS). jsonl_path può essere
+    anche una lista di file.
+
+    Con n_workers > 1 il file viene diviso in intervalli di byte allineati alle
+    righe e processato da un pool di processi; gli aggregati parziali vengono
+    poi fusi. Il risultato è identico a quello seriale.
+
+    Con use_table=True (e pyarrow installato) si legge la tabella colonnare per
+    partita costruita una sola volta dal JSONL (vedi lichess_games_table.py),
+    ricostruita automaticamente solo se il JSONL cambia.
+
+    Con state_path (modalità incrementale, vedi incremental_state.py) gli
+    aggregati parziali vengono salvati insieme ai byte già letti: le run
+    successive leggono solo le righe aggiunte e i file nuovi. In questa
+    modalità si legge sempre il JSONL (la tabella andrebbe ricostruita a ogni
+    append).
+
+    Con sweep=True il risultato contiene anche "<raggruppamento>_sweep": la
+    curva di svantaggio per soglia in formato lungo (vedi finalize_sweep).
+    """
+    groupings = list(GROUPINGS) if groupings is None else list(groupings)
+    paths = [jsonl_path] if isinstance(jsonl_path, (str, os.PathLike)) else list(jsonl_path)
+    # soglie della curva solo se richiesta: senza, kernel e stati hanno solo quelle di AGG_SPEC
+    sweep_thresholds = _sweep_thresholds() if sweep else []
+
+    # trie delle aperture costruito (o aggiornato) qui una sola volta: i worker
+    # trovano la cache già pronta e la leggono soltanto, senza ricostruirla
+    # tutti insieme
+    with timed("opening_trie"):
+        load_opening_trie(openings_path)
+
+    partials = {name: {} for name in groupings}
+    if state_path is not None:
+        signature = _state_signature(openings_path, groupings, sweep_thresholds)
+        state = load_state(state_path, signature)
+        ranges = pending_ranges(state, paths) if state is not None else None
+        if ranges is None:
+            state = None
+            ranges = pending_ranges(None, paths)
+        else:
+            partials = state["data"]
+        print(f"Modalità incrementale: {sum(e - s for _, s, e in ranges)} byte nuovi da leggere")
+        tasks = _range_tasks(ranges, openings_path, groupings, n_workers, sweep_thresholds)
+    else:
+        tasks = []
+        for path in paths:
+            with timed("games_table"):
+                table_dir = ensure_games_table(path, n_workers) if use_table else None
+            if table_dir is not None:
+                tasks += [(_scan_table_part, part, openings_path, groupings, sweep_thresholds)
+                          for part in table_parts(table_dir)]
+            else:
+                tasks += _range_tasks([(path, 0, os.path.getsize(path))], openings_path, groupings, n_workers,
+                                       sweep_thresholds)
+
+    def collect(result):
+        shard_partials, shard_metrics = result
+        merge_metrics(RUN_METRICS, shard_metrics)
+        with timed("merge", records=1):
+            merge_partials(partials, shard_partials)
+
+    if n_workers <= 1:
+        for func, *args in tasks:
+            collect(func(*args))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            futures = [pool.submit(func, *args) for func, *args in tasks]
+            for fut in futures:
+                collect(fut.result())
+
+    if state_path is not None:
+        with timed("write"):
+            save_state(state_path, signature, paths, partials, ranges, state)
+
+    with timed("merge", records=sum(len(partials[name]) for name in groupings)):
+        result = {
+            name: finalize_partials(partials[name], GROUPINGS[name])
+            for name in groupings
+        }
+        if sweep:
+            for name in groupings:
+                result[f"{name}_sweep"] = finalize_sweep(partials[name], GROUPINGS[name], sweep_thresholds)
+        return result
+
+
+def merge_and_save(df_stats, csv_path, output_path, keys):
+    """Merge (inner) delle statistiche col CSV dei percentili e salvataggio."""
+    with timed("merge", records=len(df_stats)):
+        df_csv = pd.read_csv(csv_path)
+        df_merged = pd.merge(
+            df_csv,
+            df_stats,
+            how="inner",
+            on=keys
+        )
+    with timed("write", records=len(df_merged)):
+        df_merged.to_csv(output_path, index=False)
+    print(f"File salvato come {output_path}")
@@ -0,0 +1,216 @@
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from jsonl_reader import iter_jsonl, split_line_ranges
+from table_cache import cache_is_fresh, write_cache_meta
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # senza pyarrow gli script rileggono direttamente il JSONL
+    pa = pq = None
+
+# Tabella colonnare (Parquet) per partita, costruita una sola volta da
+# lichess_games_matched.jsonl. Contiene solo i campi "grezzi" della partita
+# (nessun dato dipendente dall'analisi), quindi resta valida finché il JSONL
+# non cambia: la cache è legata all'hash del contenuto del sorgente.
+#
+# Layout: <jsonl senza estensione>.parquet/ è una directory con un file
+# part-NNNNN.parquet per intervallo di byte del JSONL e i metadati _meta.json.
+
+TABLE_VERSION = 1
+ROWS_PER_BATCH = 50_000
+
+PLAYER_STATS = ["inaccuracy", "mistake", "blunder", "acpl", "accuracy"]
+
+if pa is not None:
+    GAME_SCHEMA = pa.schema(
+        [
+            ("username", pa.string()),        # chiave della riga JSONL
+            ("game_username", pa.string()),   # detail["username"]
+            ("created_at", pa.int64()),
+            ("speed", pa.string()),
+            ("eco", pa.string()),
+            ("opening_name", pa.string()),
+            ("opening_ply", pa.int64()),
+            ("moves", pa.string()),
+            ("status", pa.string()),
+            ("winner", pa.string()),
+            ("division_middle", pa.int64()),
+            ("division_end", pa.int64()),
+        ]
+        + [
+            field
+            for color in ["white", "black"]
+            for field in [(f"{color}_id", pa.string()), (f"{color}_rating", pa.int64())]
+            + [(f"{color}_{stat}", pa.float64()) for stat in PLAYER_STATS]
+        ]
+        + [
+            ("clocks", pa.list_(pa.int64())),
+            ("evals", pa.list_(pa.int64())),  # null dove l'analisi non ha "eval" (es. matto)
+        ]
+    )
+
+
+def game_row(username, detail):
+    """Appiattisce un dettaglio partita JSON in una riga della tabella."""
+    opening = detail.get("opening")
+    if not isinstance(opening, dict):
+        opening = {}
+    division = detail.get("division") or {}
+    players = detail.get("players") or {}
+
+    row = {
+        "username": username,
+        "game_username": detail.get("username"),
+        "created_at": detail.get("createdAt"),
+        "speed": detail.get("speed"),
+        "eco": opening.get("eco"),
+        "opening_name": opening.get("name"),
+        "opening_ply": opening.get("ply"),
+        "moves": detail.get("moves"),
+        "status": detail.get("status"),
+        "winner": detail.get("winner"),
+        "division_middle": division.get("middle"),
+        "division_end": division.get("end"),
+    }
+    for color in ["white", "black"]:
+        player = players.get(color) or {}
+        analysis = player.get("analysis") or {}
+        row[f"{color}_id"] = (player.get("user") or {}).get("id")
+        row[f"{color}_rating"] = player.get("rating")
+        for stat in PLAYER_STATS:
+            row[f"{color}_{stat}"] = analysis.get(stat)
+    row["clocks"] = detail.get("clocks")
+    row["evals"] = [a.get("eval") if isinstance(a, dict) else None for a in detail.get("analysis") or []]
+    return row
+
+
+def detail_from_row(row):
+    """Ricostruisce (username, dettaglio) nel formato atteso da process_game."""
+    detail = {}
+    for key, col in [("username", "game_username"), ("createdAt", "created_at"),
+                     ("speed", "speed"), ("moves", "moves"), ("status", "status"),
+                     ("winner", "winner")]:
+        if row.get(col) is not None:
+            detail[key] = row[col]
+    if row.get("opening_name") is not None or row.get("eco") is not None or row.get("opening_ply") is not None:
+        detail["opening"] = {"eco": row.get("eco"), "name": row.get("opening_name"), "ply": row.get("opening_ply")}
+    division = {}
+    if row.get("division_middle") is not None:
+        division["middle"] = row["division_middle"]
+    if row.get("division_end") is not None:
+        division["end"] = row["division_end"]
+    if division:
+        detail["division"] = division
+
+    players = {}
+    for color in ["white", "black"]:
+        player = {}
+        if row.get(f"{color}_id") is not None:
+            player["user"] = {"id": row[f"{color}_id"]}
+        if row.get(f"{color}_rating") is not None:
+            player["rating"] = row[f"{color}_rating"]
+        analysis = {stat: row[f"{color}_{stat}"] for stat in PLAYER_STATS if row.get(f"{color}_{stat}") is not None}
+        if analysis:
+            player["analysis"] = analysis
+        players[color] = player
+    detail["players"] = players
+
+    if row.get("clocks"):
+        detail["clocks"] = row["clocks"]
+    if row.get("evals"):
+        detail["analysis"] = [{"eval": v} if v is not None else {} for v in row["evals"]]
+    return row.get("username"), detail
+
+
+def _build_part(jsonl_path, start, end, part_path):
+    """Worker: converte le righe in [start, end) in un file Parquet."""
+    writer = pq.ParquetWriter(part_path, GAME_SCHEMA)
+    rows = []
+    for obj in iter_jsonl(jsonl_path, start, end, skip_invalid=True):
+        for username, games_list in obj.items():
+            for g in games_list:
+                for detail in g.get("details", []):
+                    rows.append(game_row(username, detail))
+        if len(rows) >= ROWS_PER_BATCH:
+            writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=GAME_SCHEMA))
+            rows = []
+    if rows:
+        writer.write_batch(pa.RecordBatch.from_pylist(rows, schema=GAME_SCHEMA))
+    writer.close()
+    return part_path
+
+
+def games_table_dir(jsonl_path):
+    return Path(jsonl_path).with_suffix(".parquet")
+
+
+def ensure_games_table(jsonl_path, n_workers=1):
+    """
+    Restituisce la directory della tabella per partita, (ri)costruendola dal
+    JSONL se manca o se l'hash del contenuto del sorgente è cambiato.
+    Restituisce None se pyarrow non è installato.
+    """
+    if pa is None:
+        return None
+    table_dir = games_table_dir(jsonl_path)
+    meta_path = table_dir / "_meta.json"
+    fresh, fingerprints = cache_is_fresh(meta_path, [jsonl_path], TABLE_VERSION)
+    if fresh:
+        return table_dir
+
+    print(f"Costruisco la tabella per partita {table_dir} da {jsonl_path}")
+    if table_dir.exists():
+        shutil.rmtree(table_dir)
+    table_dir.mkdir(parents=True)
+    ranges = split_line_ranges(jsonl_path, max(1, n_workers) * 4)
+    parts = [str(table_dir / f"part-{k:05d}.parquet") for k in range(len(ranges))]
+    if n_workers <= 1:
+        for (start, end), part in zip(ranges, parts):
+            _build_part(jsonl_path, start, end, part)
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            list(pool.map(_build_part, [jsonl_path] * len(parts),
+                          [r[0] for r in ranges], [r[1] for r in ranges], parts))
+    write_cache_meta(meta_path, fingerprints, TABLE_VERSION)
+    return table_dir
+
+
+def table_parts(table_dir):
+    return sorted(str(p) for p in Path(table_dir).glob("part-*.parquet"))
+
+
+def iter_game_rows(part_path, columns=None):
+    """Righe (dict) di un file della tabella, leggendo solo le colonne richieste."""
+    pf = pq.ParquetFile(part_path)
+    for batch in pf.iter_batches(batch_size=ROWS_PER_BATCH, columns=columns):
+        yield from batch.to_pylist()
+
+
+def iter_detail_batches(part_path):
+    """
+    Blocchi (ROWS_PER_BATCH partite) di un file della tabella come
+    ([(username, dettaglio)], colonna clocks, colonna evals): i dettagli sono
+    quelli di detail_from_row senza clocks e analysis, che restano colonne
+    lista di pyarrow per i kernel a blocchi di game_kernels.py.
+    """
+    pf = pq.ParquetFile(part_path)
+    for batch in pf.iter_batches(batch_size=ROWS_PER_BATCH):
+        names = [name for name in batch.schema.names if name not in ("clocks", "evals")]
+        rows = pa.RecordBatch.from_arrays([batch.column(name) for name in names], names=names).to_pylist()
+        yield [detail_from_row(row) for row in rows], batch.column("clocks"), batch.column("evals")
+
+
+def iter_games_frames(jsonl_path, columns, n_workers=1):
+    """
+    DataFrame a blocchi (ROWS_PER_BATCH partite) con le sole colonne
+    richieste (proiezione): la memoria resta limitata al blocco.
+    """
+    table_dir = ensure_games_table(jsonl_path, n_workers)
+    if table_dir is None:
+        raise ImportError("pyarrow non installato: impossibile leggere la tabella per partita")
+    for part in table_parts(table_dir):
+        for batch in pq.ParquetFile(part).iter_batches(batch_size=ROWS_PER_BATCH, columns=columns):
+            yield batch.to_pandas()
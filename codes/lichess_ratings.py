@@ -0,0 +1,142 @@
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from jsonl_reader import iter_jsonl, split_line_ranges
+from lichess_dates import parse_dates_shifted
+from table_cache import atomic_output, cache_is_fresh, write_cache_meta
+
+# Tabella lunga delle rating_history Lichess, costruita una sola volta (in
+# parallelo) da lichess_users.jsonl e salvata accanto al JSONL (.ratings.npz):
+# gli script 02 (globale e mensile) ripartono dagli array senza rileggere né
+# ordinare i dict JSON. Come le altre cache è legata all'hash del contenuto.
+#
+# Una serie per (occorrenza utente × game_type) con rating_history non vuota,
+# nell'ordine del JSONL:
+#   series_occ:  indice dell'occorrenza utente → user_ids[occ], n_puzzles[occ]
+#   series_type: game_type della serie
+# Una riga per voce di rating_history con data valida, nell'ordine del dict:
+#   series: indice della serie
+#   date:   datetime64[D] (chiavi "G-M-AAAA" con mese in base 0, vedi lichess_dates.py)
+#   rating: int64
+# n_puzzles è il campo puzzle.games dell'utente (NaN se manca).
+
+RATINGS_VERSION = 1
+
+
+def _ingest_range(jsonl_path, start, end):
+    """Worker: righe in [start, end) → array della tabella (occ e serie locali allo shard)."""
+    user_ids, n_puzzles = [], []
+    series_occ, series_type = [], []
+    series, keys, ratings = [], [], []
+    for data in iter_jsonl(jsonl_path, start, end):
+        for user_id, games in data.items():
+            k = len(user_ids)
+            user_ids.append(user_id)
+            n = (games.get("puzzle") or {}).get("games")
+            n_puzzles.append(np.nan if n is None else n)
+            for game_type, game_data in games.items():
+                rating_history = game_data.get("rating_history", {})
+                if not rating_history:
+                    continue
+                series.extend([len(series_occ)] * len(rating_history))
+                series_occ.append(k)
+                series_type.append(game_type)
+                keys.extend(rating_history)
+                ratings.extend(rating_history.values())
+
+    dates = parse_dates_shifted(keys)
+    ok = ~np.isnat(dates)  # le date non valide non servono a nessuna analisi
+    return {
+        "user_ids": np.array(user_ids, dtype=str),
+        "n_puzzles": np.array(n_puzzles, dtype=np.float64),
+        "series_occ": np.array(series_occ, dtype=np.int64),
+        "series_type": np.array(series_type, dtype=str),
+        "series": np.array(series, dtype=np.int64)[ok],
+        "date": dates[ok],
+        "rating": np.array(ratings, dtype=np.int64)[ok],
+    }
+
+
+def ratings_path(jsonl_path):
+    return Path(jsonl_path).with_suffix(".ratings.npz")
+
+
+def build_lichess_ratings(jsonl_path, n_workers=1):
+    """Legge il JSONL (in parallelo con n_workers > 1) e restituisce la tabella come dict di array."""
+    ranges = split_line_ranges(jsonl_path, max(1, n_workers) * 4)
+    if n_workers <= 1:
+        shards = [_ingest_range(jsonl_path, start, end) for start, end in ranges]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as pool:
+            shards = list(pool.map(_ingest_range, [jsonl_path] * len(ranges),
+                                   [r[0] for r in ranges], [r[1] for r in ranges]))
+
+    n_occ = n_series = 0
+    for arrays in shards:  # gli shard sono in ordine di file
+        arrays["series_occ"] = arrays["series_occ"] + n_occ
+        arrays["series"] = arrays["series"] + n_series
+        n_occ += len(arrays["user_ids"])
+        n_series += len(arrays["series_occ"])
+    empty = {
+        "user_ids": np.zeros(0, dtype=str), "n_puzzles": np.zeros(0),
+        "series_occ": np.zeros(0, dtype=np.int64), "series_type": np.zeros(0, dtype=str),
+        "series": np.zeros(0, dtype=np.int64), "date": np.zeros(0, dtype="datetime64[D]"),
+        "rating": np.zeros(0, dtype=np.int64),
+    }
+    return {
+        name: np.concatenate([s[name] for s in shards]) if shards else value
+        for name, value in empty.items()
+    }
+
+
+def load_lichess_ratings(jsonl_path, n_workers=1):
+    """Tabella dal file .ratings.npz accanto al JSONL, ricostruita solo se il JSONL è cambiato."""
+    path = ratings_path(jsonl_path)
+    meta_path = path.with_suffix(".meta.json")
+    fresh, fingerprints = cache_is_fresh(meta_path, [jsonl_path], RATINGS_VERSION)
+    if fresh and path.exists():
+        with np.load(path) as npz:
+            return {name: npz[name] for name in npz.files}
+
+    print(f"Costruisco la tabella dei rating {path} da {jsonl_path}")
+    table = build_lichess_ratings(jsonl_path, n_workers)
+    with atomic_output(path, suffix=".npz") as tmp:
+        np.savez(tmp, **table)
+    write_cache_meta(meta_path, fingerprints, RATINGS_VERSION,
+                     entries=len(table["rating"]), series=len(table["series_occ"]))
+    return table
+
+
+def rating_entries(table, start_date=None):
+    """
+    DataFrame lungo (series, date, rating) con le sole date >= start_date,
+    ordinato per serie e data; a parità di data resta l'ordine del dict JSON.
+    """
+    series, date, rating = table["series"], table["date"], table["rating"]
+    if start_date is not None:
+        keep = date >= start_date
+        series, date, rating = series[keep], date[keep], rating[keep]
+    order = np.lexsort((date, series))  # stabile
+    return pd.DataFrame({"series": series[order], "date": date[order], "rating": rating[order]})
+
+
+def series_info(table, series):
+    """user_id, n_puzzles e game_type per un array di indici di serie."""
+    occ = table["series_occ"][series]
+    return pd.DataFrame({
+        "user_id": table["user_ids"].astype(object)[occ],
+        "n_puzzles": pd.array(table["n_puzzles"][occ]).astype("Int64"),
+        "game_type": table["series_type"].astype(object)[series],
+    })
+
+
+if __name__ == "__main__":
+    import os
+    import sys
+
+    # Costruzione anticipata della tabella: python lichess_ratings.py [lichess_users.jsonl]
+    source = sys.argv[1] if len(sys.argv) > 1 else r"output\lichess_users.jsonl"
+    load_lichess_ratings(source, os.cpu_count() or 1)
@@ -0,0 +1,122 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+# Metriche delle fasi di elaborazione (read, decode, process_game, aggregate,
+# merge, write): per ogni fase tempo, record elaborati e record falliti.
+# Le metriche sono dict {fase: [secondi, record, falliti]} fondibili tra
+# processi: i worker restituiscono le proprie insieme agli aggregati e il
+# processo principale le somma in RUN_METRICS. A fine script
+# write_run_metrics scrive un JSON per run con anche il tempo totale e la
+# memoria di picco.
+#
+# Nei worker i tempi sono sommati su tutti i processi (tempo di CPU per
+# fase, non di orologio); il tempo di orologio dello script è wall_s.
+#
+# progress_reporter sostituisce le stampe per riga: al massimo una riga ogni
+# PROGRESS_EVERY secondi.
+
+PROGRESS_EVERY = 10.0
+RUN_METRICS = {}
+RUN_STARTED = time.time()
+
+
+def add_metric(metrics, stage, seconds, records=0, failures=0):
+    entry = metrics.setdefault(stage, [0.0, 0, 0])
+    entry[0] += seconds
+    entry[1] += records
+    entry[2] += failures
+
+
+def merge_metrics(metrics, other):
+    """Somma le metriche `other` dentro `metrics`."""
+    for stage, (seconds, records, failures) in other.items():
+        add_metric(metrics, stage, seconds, records, failures)
+    return metrics
+
+
+@contextmanager
+def timed(stage, records=0, metrics=None):
+    """Misura il blocco come fase `stage` (default: metriche della run)."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_metric(RUN_METRICS if metrics is None else metrics, stage, time.perf_counter() - t0, records)
+
+
+def progress_reporter(label, total=None, every=PROGRESS_EVERY):
+    """
+    Funzione update(records, done=None) che stampa l'avanzamento (record,
+    record/s e, con `total`, percentuale di `done`) al più una volta ogni
+    `every` secondi.
+    """
+    t0 = last = time.perf_counter()
+    count = 0
+
+    def update(records=1, done=None):
+        nonlocal last, count
+        count += records
+        now = time.perf_counter()
+        if now - last < every:
+            return
+        last = now
+        rate = count / (now - t0) if now > t0 else 0.0
+        pct = f" {100 * done / total:5.1f}%" if total and done is not None else ""
+        print(f"{label}{pct} {count} record, {rate:,.0f} record/s", flush=True)
+
+    return update
+
+
+def peak_memory_mb():
+    """Memoria di picco (MB) del processo e dei figli terminati; None se non misurabile."""
+    try:
+        import resource
+    except ImportError:  # Windows: serve psutil
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 2**20
+    unit = 1 if sys.platform == "darwin" else 1024  # ru_maxrss: byte su macOS, KB su Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) * unit / 2**20
+
+
+def metrics_report(metrics):
+    """{fase: {seconds, records, failures, records_per_s}} ordinato per fase."""
+    return {
+        stage: {
+            "seconds": round(seconds, 4),
+            "records": records,
+            "failures": failures,
+            "records_per_s": round(records / seconds, 1) if seconds and records else None,
+        }
+        for stage, (seconds, records, failures) in metrics.items()
+    }
+
+
+def write_run_metrics(metrics_dir, name, metrics=None, **extra):
+    """Scrive <metrics_dir>/<name>_<data-ora>.json con le metriche della run; restituisce il percorso."""
+    metrics = RUN_METRICS if metrics is None else metrics
+    started = datetime.fromtimestamp(RUN_STARTED)
+    path = Path(metrics_dir) / f"{name}_{started:%Y%m%d-%H%M%S}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    report = {
+        "script": name,
+        "started": started.isoformat(timespec="seconds"),
+        "wall_s": round(time.time() - RUN_STARTED, 3),
+        "peak_mb": peak_memory_mb(),
+        "pid": os.getpid(),
+        **extra,
+        "stages": metrics_report(metrics),
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Metriche salvate in {path}")
+    return path
@@ -0,0 +1,127 @@
+import pickle
+import re
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+
+from table_cache import atomic_output, cache_is_fresh, write_cache_meta
+
+# Trie (albero dei prefissi) compilato su tutte le linee PGN di openings_with_ply.tsv.
+# Più varianti possono avere lo stesso nome: a differenza del vecchio dizionario
+# nome → mosse (dove l'ultima riga sovrascriveva le precedenti) il trie le tiene tutte.
+#
+# Struttura (dict serializzato con pickle accanto al TSV):
+#   edges: {(nodo, mossa SAN): nodo figlio}      radice = nodo 0
+#   names: per nodo, frozenset dei nomi delle linee che passano dal nodo
+#   lines: per nodo, (eco, name, ply) della linea che finisce nel nodo, o None
+#   ends:  per nodo, frozenset dei nomi delle linee che finiscono nel nodo
+#   all_names: tutti i nomi di apertura del TSV
+
+TRIE_VERSION = 1
+
+
+# Trasforma la PGN teorica in lista di mosse
+def pgn_to_moves(pgn_line):
+    if isinstance(pgn_line, str) and pgn_line.strip():
+        # rimuove numeri e punti "1.", "2.", ecc.
+        pgn_clean = re.sub(r'\d+\.\s*', '', pgn_line)
+        moves = [m for m in pgn_clean.split() if m.strip() != '']
+        return moves
+    return []
+
+
+def build_opening_trie(openings_path):
+    df_openings = pd.read_csv(openings_path, sep="\t")  # eco, name, pgn, ply_theoretical
+    edges = {}
+    names = [set()]
+    ends = [set()]
+    lines = [None]
+    for eco, name, pgn in zip(df_openings["eco"], df_openings["name"], df_openings["pgn"]):
+        moves = pgn_to_moves(pgn)
+        if not moves:
+            continue
+        node = 0
+        for move in moves:
+            child = edges.get((node, move))
+            if child is None:
+                child = edges[(node, move)] = len(names)
+                names.append(set())
+                ends.append(set())
+                lines.append(None)
+            node = child
+            names[node].add(name)
+        ends[node].add(name)
+        if lines[node] is None:  # linee con PGN identica: si tiene la prima
+            lines[node] = (eco, name, len(moves))
+    return {
+        "edges": edges,
+        "names": [frozenset(n) for n in names],
+        "lines": lines,
+        "ends": [frozenset(n) for n in ends],
+        "all_names": frozenset(df_openings["name"].dropna()),
+    }
+
+
+def trie_cache_path(openings_path):
+    return Path(openings_path).with_suffix(".trie.pkl")
+
+
+@lru_cache(maxsize=None)
+def load_opening_trie(openings_path):
+    """Trie dal file pickle accanto al TSV, ricostruito solo se il TSV è cambiato."""
+    cache_path = trie_cache_path(openings_path)
+    meta_path = cache_path.with_suffix(".meta.json")
+    fresh, fingerprints = cache_is_fresh(meta_path, [openings_path], TRIE_VERSION)
+    if fresh and cache_path.exists():
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+
+    trie = build_opening_trie(openings_path)
+    # pickle completo al suo posto prima dei metadati che lo dichiarano valido
+    with atomic_output(cache_path) as tmp:
+        with open(tmp, "wb") as f:
+            pickle.dump(trie, f, protocol=pickle.HIGHEST_PROTOCOL)
+    write_cache_meta(meta_path, fingerprints, TRIE_VERSION)
+    return trie
+
+
+def match_opening(trie, game_moves, opening_name=None, ply_theoretical=None):
+    """
+    Segue le mosse della partita nel trie, in O(semimosse giocate in teoria).
+    Restituisce (opening_gap, deepest_line):
+    - opening_gap: semimosse teoriche (ply_theoretical) non giocate lungo le
+      linee che portano il nome dell'apertura etichettata; 0 se la partita
+      arriva a ply_theoretical o completa una di quelle linee (come prima,
+      quando la linea del TSV è più corta di ply_theoretical). None se il
+      nome non è nel TSV o manca ply_theoretical
+    - deepest_line: (eco, name, ply) della linea teorica più profonda seguita
+      dalla partita, o None
+    """
+    edges, names, ends, lines = trie["edges"], trie["names"], trie["ends"], trie["lines"]
+    following = opening_name in trie["all_names"] and ply_theoretical is not None
+    node = 0
+    depth = 0
+    matched = 0        # semimosse seguite lungo una linea col nome etichettato
+    completed = False  # la partita ha completato una linea col nome etichettato
+    deepest_line = None
+    for move in game_moves:
+        child = edges.get((node, move))
+        if child is None:
+            break
+        node = child
+        depth += 1
+        if following:
+            if depth <= ply_theoretical and opening_name in names[node]:
+                matched = depth
+                completed = completed or opening_name in ends[node]
+            else:
+                following = False
+        if lines[node] is not None:
+            deepest_line = lines[node]
+
+    if opening_name not in trie["all_names"] or ply_theoretical is None:
+        return None, deepest_line
+    if completed or matched >= ply_theoretical:
+        return 0, deepest_line
+    return ply_theoretical - matched, deepest_line
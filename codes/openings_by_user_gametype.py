@@ -1,19 +1,36 @@
-import json
 import csv
 from collections import defaultdict
 
+from jsonl_reader import iter_lines, loads
+from lichess_games_table import iter_games_frames, pa
+
 input_file = r"C:\Users\user\OneDrive\Desktop\progetto scacchi\definitivi\lichess_games_matched.jsonl"
-output_file = "openings_by_user_gametype.csv"
+output_file = "openings_by_user_gametype_long.csv"
+
+# Output in formato lungo e sparso: una riga (username, game_type, opening, count)
+# per ogni apertura effettivamente giocata, senza la colonna per ogni apertura
+# (quasi tutta a zero) del vecchio CSV wide. Righe nell'ordine di prima
+# comparsa di (username, game_type), aperture in ordine alfabetico.
+LONG_COLUMNS = ["username", "game_type", "opening", "count"]
 
-# Dizionario: {(username, game_type): {apertura: conteggio}}
+# Dizionario sparso: {(username, game_type): {apertura: conteggio}}
 user_openings = defaultdict(lambda: defaultdict(int))
 
-with open(input_file, "r", encoding="utf-8") as f:
-    next(f)  # salta la prima riga
-    for line in f:
-        if not line.strip():
+if pa is not None:
+    # Tabella per partita (costruita una volta dal JSONL): si leggono solo le 3
+    # colonne utili, a blocchi, e i conteggi di ogni blocco si sommano
+    for df_games in iter_games_frames(input_file, ["game_username", "speed", "opening_name"]):
+        df_games = df_games.dropna()
+        df_games = df_games[(df_games["game_username"] != "") & (df_games["speed"] != "") & (df_games["opening_name"] != "")]
+        counts = df_games.groupby(["game_username", "speed", "opening_name"], sort=False).size()
+        for (username, game_type, opening), n in counts.items():
+            user_openings[(username, game_type)][opening] += int(n)
+else:
+    # tutte le righe: il JSONL non ha intestazione (come nella tabella per partita e negli script 03)
+    for _, line in iter_lines(input_file):
+        if not line:
             continue
-        data = json.loads(line)
+        data = loads(line)
 
         for _, sessions in data.items():
             for session in sessions:
@@ -24,18 +41,11 @@ with open(input_file, "r", encoding="utf-8") as f:
                     if username and game_type and opening:
                         user_openings[(username, game_type)][opening] += 1
 
-# Trova tutte le aperture giocate (per creare le colonne del CSV)
-all_openings = sorted({opening for openings in user_openings.values() for opening in openings})
-
-# Scrive il CSV
+# Scrive il CSV lungo
 with open(output_file, "w", newline="", encoding="utf-8") as csvfile:
     writer = csv.writer(csvfile)
-    # Header: username + game_type + nomi aperture
-    writer.writerow(["username", "game_type"] + all_openings)
-
-    # Righe: username + game_type + conteggi aperture
+    writer.writerow(LONG_COLUMNS)
     for (user, game_type), openings in user_openings.items():
-        row = [user, game_type] + [openings.get(op, 0) for op in all_openings]
-        writer.writerow(row)
+        writer.writerows([user, game_type, op, openings[op]] for op in sorted(openings))
 
 print(f"✅ CSV generato in: {output_file}")
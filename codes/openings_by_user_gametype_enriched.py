@@ -1,9 +1,9 @@
 import csv
 
 # File input/output
-openings_file = "openings_by_user_gametype.csv"
+openings_file = "openings_by_user_gametype_long.csv"   # formato lungo: username, game_type, opening, count
 stats_file = "global_stats_lichess.csv"
-output_file = "openings_by_user_gametype_enriched.csv"
+output_file = "openings_by_user_gametype_enriched_long.csv"
 
 # 1. Carica i dati global_stats_lichess.csv in un dizionario {(username, game_type): (delta_percentile, rating_level)}
 user_stats = {}
@@ -16,7 +16,7 @@ with open(stats_file, "r", encoding="utf-8") as f:
         rating_level = row.get("rating_level", "")
         user_stats[(username, game_type)] = (delta_percentile, rating_level)
 
-# 2. Legge il CSV delle aperture e aggiunge delta_percentile e rating_level
+# 2. Legge il CSV lungo delle aperture (in streaming) e aggiunge delta_percentile e rating_level
 with open(openings_file, "r", encoding="utf-8") as infile, \
      open(output_file, "w", newline="", encoding="utf-8") as outfile:
     
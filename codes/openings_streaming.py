@@ -0,0 +1,83 @@
+import csv
+import os
+from collections import defaultdict
+
+import pandas as pd
+
+from jsonl_reader import iter_lines, loads
+from lichess_games_table import iter_games_frames, pa
+
+# Pipeline delle aperture in un solo processo e con UNA sola lettura delle
+# partite (sostituisce l'esecuzione in sequenza di openings_by_user_gametype.py,
+# openings_by_user_gametype_enriched.py e openings_definitivo.py, senza i CSV
+# intermedi). Ogni partita (username, game_type, apertura) viene associata con
+# un hash join a delta_percentile e rating_level di global_stats_lichess.csv e
+# contata subito per (delta_percentile, rating_level, game_type, apertura).
+# Le partite di utenti senza percentile o fascia non vengono contate, come le
+# righe vuote che openings_definitivo.py scartava nel groupby.
+
+input_file = r"C:\Users\user\OneDrive\Desktop\progetto scacchi\definitivi\lichess_games_matched.jsonl"
+stats_file = "global_stats_lichess.csv"
+output_file = "openings_definitivo.csv"
+n_workers = os.cpu_count() or 1  # costruzione parallela della tabella per partita (solo la prima volta)
+
+OUTPUT_COLUMNS = ["delta_percentile", "rating_level", "game_type", "Apertura", "Conteggio"]
+
+
+def load_user_stats(path):
+    """{(username, game_type): (delta_percentile, rating_level)} dei soli utenti con entrambi i valori."""
+    user_stats = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            user_stats[(row["user_id"], row["game_type"])] = (row.get("delta_percentile"), row.get("rating_level"))
+    return {key: value for key, value in user_stats.items() if all(value)}
+
+
+def count_from_table(jsonl_path, user_stats, counts):
+    """Tabella per partita a blocchi: join e conteggi vettoriali per blocco."""
+    stats = pd.DataFrame(
+        [(user, game_type, pct, level) for (user, game_type), (pct, level) in user_stats.items()],
+        columns=["game_username", "speed", "delta_percentile", "rating_level"],
+    )
+    for df in iter_games_frames(jsonl_path, ["game_username", "speed", "opening_name"], n_workers):
+        df = df.dropna()
+        df = df[(df["game_username"] != "") & (df["speed"] != "") & (df["opening_name"] != "")]
+        joined = df.merge(stats, on=["game_username", "speed"], how="inner")
+        block = joined.groupby(["delta_percentile", "rating_level", "speed", "opening_name"], sort=False).size()
+        for key, n in block.items():
+            counts[key] += int(n)
+
+
+def count_from_jsonl(jsonl_path, user_stats, counts):
+    """Senza pyarrow: JSONL in streaming, una partita alla volta."""
+    for _, line in iter_lines(jsonl_path):  # tutte le righe, come openings_by_user_gametype.py
+        if not line:
+            continue
+        data = loads(line)
+        for _, sessions in data.items():
+            for session in sessions:
+                for game in session.get("details", []):
+                    username = game.get("username")
+                    game_type = game.get("speed")
+                    opening = game.get("opening", {}).get("name")
+                    if username and game_type and opening:
+                        stats = user_stats.get((username, game_type))
+                        if stats:
+                            counts[(*stats, game_type, opening)] += 1
+
+
+if __name__ == "__main__":  # necessario per il pool di processi (spawn su Windows)
+    user_stats = load_user_stats(stats_file)
+
+    # {(delta_percentile, rating_level, game_type, apertura): conteggio}
+    counts = defaultdict(int)
+    if pa is not None:
+        count_from_table(input_file, user_stats, counts)
+    else:
+        count_from_jsonl(input_file, user_stats, counts)
+
+    # stesso ordinamento del groupby di openings_definitivo.py
+    df_final = pd.DataFrame([(*key, n) for key, n in sorted(counts.items())], columns=OUTPUT_COLUMNS)
+    df_final.to_csv(output_file, index=False)
+
+    print(f"✅ CSV generato: {output_file}")
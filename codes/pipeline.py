@@ -0,0 +1,254 @@
+import argparse
+import ast
+import glob
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+# Esecuzione della pipeline in stile make: ogni script dichiara i file che
+# legge e quelli che scrive, le dipendenze tra script si ricavano dai file
+# (un input prodotto da un altro script) più gli "after" espliciti dove il
+# passaggio è fatto a mano (es. i CSV dei percentili copiati dallo 02 allo 03).
+#
+# Uno script viene saltato se tutti i suoi output esistono e sono più recenti
+# dei suoi input, del suo codice e dei moduli locali che importa; viene
+# rieseguito se è rieseguito uno script da cui dipende. I rami indipendenti
+# (es. FIDE 00 → 01 e Lichess 02 → 03 → 04) girano in parallelo.
+#
+# I percorsi sono quelli delle configurazioni in testa agli script (relativi
+# alla cartella di lavoro `workdir`): se si cambia un percorso in uno script
+# va aggiornato anche qui.
+#
+# Uso: python pipeline.py [stage ...] [--force] [--dry-run] [--jobs N] [--workdir DIR]
+
+CODE_DIR = Path(__file__).resolve().parent
+workdir = "."              # cartella da cui si lanciano gli script
+max_jobs = 2               # script in esecuzione contemporanea (ognuno usa già più processi)
+log_dir = "pipeline_logs"  # stdout/stderr di ogni script, relativo a workdir
+
+GAMES_JSONL = r"C:\Users\user\OneDrive\Desktop\progetto scacchi\definitivi\lichess_games_matched.jsonl"
+OPENINGS_DIR = r"C:\Users\user\OneDrive\Desktop\progetto scacchi\analisi_2"
+OPENINGS_TSV = OPENINGS_DIR + r"\openings_with_ply.tsv"
+
+STAGES = [
+    # --- FIDE ---
+    {
+        "name": "elo_clustering",
+        "script": "00_analisi1_elo_clustering.py",
+        "inputs": [r"output\fide_scraping_user.jsonl"],
+        "outputs": [r"analisi\output_analisi\analisi1_elo_clustering.csv"],
+    },
+    {
+        "name": "ci_delta_elo",
+        "script": "01_analisi1_ci_delta_elo.py",
+        "inputs": [r"output\lichess_activity_matched.jsonl", r"analisi\output_analisi\analisi1_elo_clustering.csv"],
+        "outputs": [
+            r"analisi\output_analisi\analisi1_ci_quarterly.csv",
+            r"Analisi\output_analisi\analisi1_ci_delta_elo_join_inner.csv",
+            r"analisi\output_analisi\analisi1_ci_delta_elo_scatter_plot.png",
+        ],
+    },
+    # --- Lichess ---
+    {
+        "name": "global_rating_clustering",
+        "script": "02_analisi2_global_rating_clustering.py",
+        "inputs": [r"output\lichess_users.jsonl"],
+        "outputs": [r"analisi\output_analisi\analisi2_global_rating_clustering.csv"],
+    },
+    {
+        "name": "monthly_rating_clustering",
+        "script": "02_analisi2_monthly_rating_clustering.py",
+        "inputs": ["lichess_users.jsonl"],
+        "outputs": [r"..\csvs\monthly_delta_rating_percentiles.csv"],
+    },
+    {
+        "name": "stats_lichess",
+        "script": "03_analisi2_stats_lichess.py",
+        "inputs": [GAMES_JSONL, OPENINGS_TSV, "global_delta_rating_percentiles.csv", "monthly_delta_rating_percentiles.csv"],
+        "outputs": ["global_stats_lichess.csv", "monthly_stats_lichess.csv",
+                    "global_disadvantage_sweep.csv", "monthly_disadvantage_sweep.csv"],
+        "after": ["global_rating_clustering", "monthly_rating_clustering"],  # CSV dei percentili copiati a mano
+    },
+    {
+        "name": "tot_matches",
+        "script": "04_analisi2_global_stats_lichess_tot_matches.py",
+        "inputs": ["lichess_activity_matched.jsonl", "global_stats_lichess.csv", "monthly_stats_lichess.csv"],
+        "outputs": ["global_stats_lichess_tot_matches.csv", "monthly_stats_lichess_tot_matches.csv"],
+    },
+    # --- Aperture ---
+    {
+        "name": "openings_tsv",
+        "script": "generate_csv_openings.py",
+        "inputs": [OPENINGS_DIR + r"\*.tsv"],
+        "outputs": [OPENINGS_TSV],
+    },
+    {
+        # conteggio, join con global_stats_lichess.csv e aggregazione in un solo
+        # passaggio (openings_by_user_gametype*.py e openings_definitivo.py
+        # restano per avere anche i CSV per utente)
+        "name": "openings_definitivo",
+        "script": "openings_streaming.py",
+        "inputs": [GAMES_JSONL, "global_stats_lichess.csv"],
+        "outputs": ["openings_definitivo.csv"],
+        "after": ["openings_tsv"],
+    },
+]
+
+
+def local_modules(script, seen=None):
+    """Lo script e i moduli di CODE_DIR che importa (ricorsivamente)."""
+    seen = set() if seen is None else seen
+    path = CODE_DIR / script
+    if path in seen or not path.exists():
+        return seen
+    seen.add(path)
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            local_modules(name.split(".")[0] + ".py", seen)
+    return seen
+
+
+def stage_dependencies(stages):
+    """{stage: insieme degli stage da cui dipende} (file prodotti + after)."""
+    producers = {out: s["name"] for s in stages for out in s["outputs"]}
+    names = {s["name"] for s in stages}
+    deps = {}
+    for s in stages:
+        d = {producers[p] for p in s["inputs"] if p in producers} | set(s.get("after", []))
+        unknown = d - names
+        if unknown:
+            raise ValueError(f"{s['name']}: stage sconosciuti in after: {sorted(unknown)}")
+        deps[s["name"]] = d - {s["name"]}
+    return deps
+
+
+def _expand(path, base):
+    full = os.path.join(base, path)
+    return glob.glob(full) if glob.has_magic(path) else [full]
+
+
+def stale_reason(stage, base):
+    """Motivo per cui lo stage va rieseguito, None se gli output sono aggiornati."""
+    outputs = [os.path.join(base, p) for p in stage["outputs"]]
+    missing = [p for p in outputs if not os.path.exists(p)]
+    if missing:
+        return f"output mancante {missing[0]}"
+    oldest_output = min(os.path.getmtime(p) for p in outputs)
+
+    sources = [f for p in stage["inputs"] for f in _expand(p, base)]
+    sources = [f for f in sources if f not in outputs]  # es. il TSV aggregato sta tra i TSV letti
+    sources += [str(p) for p in local_modules(stage["script"])]
+    for src in sources:
+        if not os.path.exists(src):
+            return f"input mancante {src}"
+        if os.path.getmtime(src) > oldest_output:
+            return f"{src} più recente degli output"
+    return None
+
+
+def run_stage(stage, base, logs):
+    """Esegue lo script con cwd = base; stdout/stderr nel file di log dello stage."""
+    Path(logs).mkdir(parents=True, exist_ok=True)
+    log_path = Path(logs) / f"{stage['name']}.log"
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [str(CODE_DIR), os.environ.get("PYTHONPATH")])))
+    t0 = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.run(
+            [sys.executable, str(CODE_DIR / stage["script"])],
+            cwd=base, env=env, stdout=log, stderr=subprocess.STDOUT,
+        )
+    return proc.returncode, time.perf_counter() - t0, log_path
+
+
+def run_pipeline(stages, targets=None, force=False, dry_run=False, jobs=max_jobs, base=workdir, logs=None):
+    """
+    Esegue gli stage `targets` (tutti se None) e quelli da cui dipendono.
+    Restituisce (rieseguiti, falliti) come insiemi di nomi.
+    """
+    logs = os.path.join(base, log_dir) if logs is None else logs
+    by_name = {s["name"]: s for s in stages}
+    deps = stage_dependencies(stages)
+    selected = set(targets or by_name)
+    unknown = selected - set(by_name)
+    if unknown:
+        raise ValueError(f"stage sconosciuti: {sorted(unknown)}")
+    frontier = list(selected)
+    while frontier:  # chiusura verso monte
+        for d in deps[frontier.pop()]:
+            if d not in selected:
+                selected.add(d)
+                frontier.append(d)
+
+    pending = [s["name"] for s in stages if s["name"] in selected]
+    done, rebuilt, failed = set(), set(), set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while pending or running:
+            progress = True
+            while progress:  # avvia (o salta) tutti gli stage pronti
+                progress = False
+                for name in list(pending):
+                    if not deps[name] <= done or len(running) >= jobs:
+                        continue
+                    pending.remove(name)
+                    progress = True
+                    if deps[name] & failed:
+                        print(f"[salto]  {name}: dipendenza fallita")
+                        failed.add(name)
+                        done.add(name)
+                        continue
+                    upstream = deps[name] & rebuilt
+                    reason = (
+                        "--force" if force
+                        else f"rieseguito {sorted(upstream)[0]}" if upstream
+                        else stale_reason(by_name[name], base)
+                    )
+                    if reason is None:
+                        print(f"[ok]     {name}: aggiornato")
+                        done.add(name)
+                    elif dry_run:
+                        print(f"[da fare] {name}: {reason}")
+                        rebuilt.add(name)
+                        done.add(name)
+                    else:
+                        print(f"[avvio]  {name}: {reason}")
+                        running[pool.submit(run_stage, by_name[name], base, logs)] = name
+            if not running:
+                if pending:
+                    raise ValueError(f"dipendenze circolari tra: {pending}")
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                code, elapsed, log_path = future.result()
+                done.add(name)
+                if code == 0:
+                    print(f"[fatto]  {name} in {elapsed:.1f}s")
+                    rebuilt.add(name)
+                else:
+                    print(f"[errore] {name}: exit {code} dopo {elapsed:.1f}s, vedi {log_path}")
+                    failed.add(name)
+    return rebuilt, failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Esegue la pipeline saltando gli script già aggiornati")
+    parser.add_argument("targets", nargs="*", help="stage da aggiornare (default: tutti)")
+    parser.add_argument("--force", action="store_true", help="riesegue tutto senza guardare le date")
+    parser.add_argument("--dry-run", action="store_true", help="mostra cosa verrebbe eseguito")
+    parser.add_argument("--jobs", type=int, default=max_jobs, help="script in parallelo")
+    parser.add_argument("--workdir", default=workdir, help="cartella da cui lanciare gli script")
+    args = parser.parse_args()
+
+    _, failed = run_pipeline(STAGES, args.targets, args.force, args.dry_run, args.jobs, args.workdir)
+    sys.exit(1 if failed else 0)
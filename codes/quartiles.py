@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+
+# Assegnazione vettoriale dei quartili per gruppo (fascia di rating × game_type),
+# condivisa dagli script di clustering 00 e 02.
+#
+# Semantica identica al vecchio ciclo iterrows:
+#   delta <= q25 → "0-25"   [min, q25]
+#   delta <= q50 → "25-50"  [q25, q50]
+#   delta <= q75 → "50-75"  [q50, q75]
+#   altrimenti   → "75-100" [q75, max]
+# con quantili a interpolazione lineare calcolati esattamente come
+# Series.quantile (stessa formula di np.percentile), ma per tutti i gruppi in
+# un solo ordinamento.
+
+PERCENTILE_LABELS = np.array(["0-25", "25-50", "50-75", "75-100"], dtype=object)
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+def _lerp(a, b, t):
+    # stessa interpolazione di numpy (np.percentile, method="linear")
+    diff = b - a
+    return np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+
+
+def group_quartile_edges(codes, values, n_groups):
+    """
+    Per ogni gruppo (codice 0..n_groups-1) restituisce una matrice
+    n_groups × 5 con [min, q25, q50, q75, max]; NaN per i gruppi vuoti.
+    """
+    values = np.asarray(values, dtype=float)
+    order = np.lexsort((values, codes))
+    sorted_vals = values[order]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+
+    edges = np.full((n_groups, 5), np.nan)
+    has = counts > 0
+    s, n = starts[has], counts[has]
+    edges[has, 0] = sorted_vals[s]
+    edges[has, 4] = sorted_vals[s + n - 1]
+    for j, q in enumerate(QUANTILES, start=1):
+        virtual = (n - 1) * q
+        lo = np.floor(virtual).astype(np.int64)
+        hi = np.minimum(lo + 1, n - 1)
+        edges[has, j] = _lerp(sorted_vals[s + lo], sorted_vals[s + hi], virtual - lo)
+    return edges
+
+
+def assign_quartiles(df, value_col, group_cols, active_col=None):
+    """
+    Restituisce una copia di df ordinata per gruppo (come l'iterazione di
+    groupby: gruppi in ordine, righe nell'ordine originale) con le colonne
+    delta_percentile, quartile_min, quartile_max.
+
+    Con active_col i quantili sono calcolati solo sulle righe attive
+    (active_col == 1); le righe inattive restano senza quartile e si aggiunge
+    quartile_note ("active_month" / "inactive_month", "" se il gruppo non ha
+    righe attive).
+    """
+    out = df.dropna(subset=group_cols).sort_values(group_cols, kind="stable").reset_index(drop=True)
+    codes, _ = pd.MultiIndex.from_frame(out[group_cols]).factorize()
+    codes = np.asarray(codes, dtype=np.int64)
+    n_groups = int(codes.max()) + 1 if len(codes) else 0
+    values = out[value_col].to_numpy(dtype=float)
+
+    if active_col is None:
+        ref = np.ones(len(out), dtype=bool)
+    else:
+        ref = out[active_col].to_numpy() == 1
+    edges = group_quartile_edges(codes[ref], values[ref], n_groups)[codes]
+
+    k = (values > edges[:, 1]).astype(np.int64) + (values > edges[:, 2]) + (values > edges[:, 3])
+    rows = np.arange(len(out))
+    labelled = ref & ~np.isnan(edges[:, 1])
+
+    out["delta_percentile"] = np.where(labelled, PERCENTILE_LABELS[k], "")
+    out["quartile_min"] = np.where(labelled, edges[rows, k], np.nan)
+    out["quartile_max"] = np.where(labelled, edges[rows, np.minimum(k + 1, 4)], np.nan)
+    if active_col is not None:
+        group_has_active = ~np.isnan(edges[:, 1])
+        out["quartile_note"] = np.where(
+            ~group_has_active, "", np.where(ref, "active_month", "inactive_month")
+        )
+    return out
@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+
+# Registro delle fasce di rating e classificazione vettoriale.
+# Ogni schema è {livello: (min, max)} con estremi inclusi, come i vecchi
+# dizionari rating_levels degli script; le fasce non possono sovrapporsi.
+# Un rating fuori da tutte le fasce (o che cade in un buco tra due fasce)
+# è "unknown".
+
+BAND_SCHEMES = {
+    # FIDE (script 00)
+    "fide": {
+        "Beginner":   (0, 1399),
+        "Intermedio": (1400, 1899),
+        "Avanzato":   (1900, 2200),
+        "Master":     (2201, 4000),
+    },
+    # Lichess (script 02)
+    "lichess": {
+        "too_low": (0, 1400),
+        "beginner": (1401, 1600),
+        "intermediate": (1601, 1800),
+        "advanced": (1801, 2200),
+        "expert": (2201, 2500),
+        "super_expert": (2501, 4000)
+    },
+}
+
+UNKNOWN_LEVEL = "unknown"
+
+
+def _check_bands(levels):
+    """ValueError se una fascia ha min > max o se due fasce si sovrappongono."""
+    bands = sorted(levels.items(), key=lambda x: x[1][0])
+    for name, (low, high) in bands:
+        if low > high:
+            raise ValueError(f"fascia {name}: min {low} > max {high}")
+    for (name, (_, high)), (next_name, (next_low, _)) in zip(bands, bands[1:]):
+        if next_low <= high:
+            raise ValueError(f"fasce sovrapposte: {name} e {next_name}")
+
+
+def register_band_scheme(name, levels):
+    """Registra un nuovo schema {livello: (min, max)} di fasce disgiunte."""
+    levels = dict(levels)
+    _check_bands(levels)
+    BAND_SCHEMES[name] = levels
+
+
+def classify_ratings(ratings, scheme):
+    """
+    Livello di ogni rating secondo lo schema (nome registrato o dict),
+    con una sola ricerca binaria sugli estremi inferiori ordinati.
+    Le fasce devono essere disgiunte: ogni rating cade al più in una.
+    """
+    if isinstance(scheme, str):
+        levels = BAND_SCHEMES[scheme]
+    else:
+        levels = scheme
+        _check_bands(levels)
+    bands = sorted(levels.items(), key=lambda x: x[1][0])
+    names = np.array([name for name, _ in bands] + [UNKNOWN_LEVEL], dtype=object)
+    lows = np.array([low for _, (low, _) in bands], dtype=float)
+    highs = np.array([high for _, (_, high) in bands], dtype=float)
+
+    values = np.asarray(ratings, dtype=float)
+    idx = np.searchsorted(lows, values, side="right") - 1
+    safe = np.clip(idx, 0, len(lows) - 1)
+    inside = (idx >= 0) & (values <= highs[safe])
+    return names[np.where(inside, safe, len(lows))]
+
+
+def classify_many(ratings, schemes, prefix="rating_level"):
+    """
+    DataFrame con una colonna <prefix>_<schema> per ogni schema richiesto,
+    per confrontare più suddivisioni in fasce nello stesso passaggio.
+    """
+    index = ratings.index if isinstance(ratings, pd.Series) else None
+    return pd.DataFrame(
+        {f"{prefix}_{name}": classify_ratings(ratings, name) for name in schemes},
+        index=index,
+    )
@@ -0,0 +1,129 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from lichess_ratings import rating_entries, series_info
+
+# Δ rating Lichess su finestre arbitrarie, tutte calcolate sulla tabella lunga
+# di lichess_ratings.py ordinata una sola volta (serie, data).
+#
+# Specifiche delle finestre:
+#   "M", "Q", "Y"        mese / trimestre / anno di calendario: ultimo rating
+#                        del periodo rispetto all'ultimo rating del periodo
+#                        precedente con dati (come lo script 02 mensile)
+#   "<N>D"               finestra mobile di N giorni: per ogni giorno con
+#                        rating, Δ rispetto all'ultimo rating di almeno N
+#                        giorni prima (es. "30D", "90D")
+#   "since:AAAA-MM-GG"   dalla data indicata: primo e ultimo rating della
+#                        serie (come lo script 02 globale)
+# Calendario e finestre mobili usano solo le date >= start_date; "since" usa
+# la propria data.
+#
+# A parità di data vale l'ordine del dict JSON (ultimo per "fine periodo",
+# primo per "since"), come negli script originali.
+
+CALENDAR_MONTHS = {"M": 1, "Q": 3, "Y": 12}
+WINDOW_COLS = [
+    "window", "user_id", "n_puzzles", "game_type", "period",
+    "start_date", "end_date", "start_rating", "end_rating", "delta_rating",
+]
+
+
+def parse_window(spec):
+    """Specifica → ("calendar", mesi) | ("rolling", giorni) | ("since", data)."""
+    if spec in CALENDAR_MONTHS:
+        return "calendar", CALENDAR_MONTHS[spec]
+    m = re.fullmatch(r"(\d+)D", spec)
+    if m and int(m.group(1)) > 0:
+        return "rolling", int(m.group(1))
+    if spec.startswith("since:"):
+        try:
+            return "since", np.datetime64(spec[len("since:"):], "D")
+        except ValueError:
+            pass
+    raise ValueError(f"finestra non supportata: {spec}")
+
+
+def _labels(keys, fmt):
+    # conversione a stringa sui soli valori distinti
+    uniq, inverse = np.unique(keys, return_inverse=True)
+    return np.array([fmt(k) for k in uniq.tolist()], dtype=object)[inverse]
+
+
+def _calendar(series, date, months):
+    """(inizio, fine, etichetta): ultimo rating di ogni periodo vs periodo precedente."""
+    month = date.astype("datetime64[M]").astype(np.int64)  # mesi dal 1970-01
+    key = month // months
+    last = np.flatnonzero(np.r_[(series[1:] != series[:-1]) | (key[1:] != key[:-1]), True])
+    same = series[last[1:]] == series[last[:-1]]
+    start, end = last[:-1][same], last[1:][same]
+    if months == 1:
+        fmt = lambda k: f"{1970 + k // 12:04d}-{k % 12 + 1:02d}"
+    elif months == 3:
+        fmt = lambda k: f"{1970 + k // 4:04d}-Q{k % 4 + 1}"
+    else:
+        fmt = lambda k: f"{1970 + k:04d}"
+    return start, end, _labels(key[end], fmt)
+
+
+def _rolling(series, date, days):
+    """(inizio, fine, etichetta): ogni giorno con rating vs ultimo rating di almeno `days` giorni prima."""
+    day = date.astype(np.int64)
+    if not len(day):
+        return day, day, np.zeros(0, dtype=object)
+    last = np.flatnonzero(np.r_[(series[1:] != series[:-1]) | (day[1:] != day[:-1]), True])
+    s, d = series[last], day[last]
+    # chiave unica (serie, giorno) crescente: ricerca binaria del giorno <= d - days
+    span = int(d.max() - d.min()) + days + 1
+    key = s * span + (d - d.min())
+    j = np.searchsorted(key, key - days, side="right") - 1
+    ok = (j >= 0) & (s[np.maximum(j, 0)] == s)
+    start, end = last[j[ok]], last[ok]
+    return start, end, _labels(day[end], lambda k: str(np.datetime64(k, "D")))
+
+
+def _since(series, date, from_date):
+    """(inizio, fine, etichetta): primo e ultimo rating di ogni serie dalla data indicata."""
+    idx = np.flatnonzero(date >= from_date)
+    if not len(idx):
+        return idx, idx, np.zeros(0, dtype=object)
+    change = series[idx][1:] != series[idx][:-1]
+    first, last = idx[np.r_[True, change]], idx[np.r_[change, True]]
+    return first, last, np.full(len(first), str(from_date), dtype=object)
+
+
+def window_deltas(table, windows, start_date=None):
+    """
+    Δ rating per ogni finestra in `windows` (lista di specifiche), in un
+    unico DataFrame lungo con le colonne WINDOW_COLS: righe ordinate per
+    finestra (nell'ordine dato), serie e fine periodo.
+    """
+    entries = rating_entries(table)
+    series = entries["series"].to_numpy()
+    date = entries["date"].to_numpy().astype("datetime64[D]")
+    rating = entries["rating"].to_numpy()
+    in_range = np.ones(len(series), dtype=bool) if start_date is None else date >= start_date
+    pos_in_range = np.flatnonzero(in_range)
+
+    parts = []
+    for spec in windows:
+        kind, param = parse_window(spec)
+        if kind == "since":
+            start, end, label = _since(series, date, param)
+        else:
+            step = _calendar if kind == "calendar" else _rolling
+            start, end, label = step(series[in_range], date[in_range], param)
+            start, end = pos_in_range[start], pos_in_range[end]
+        part = series_info(table, series[end])
+        part.insert(0, "window", spec)
+        part["period"] = label
+        part["start_date"] = date[start]
+        part["end_date"] = date[end]
+        part["start_rating"] = rating[start]
+        part["end_rating"] = rating[end]
+        part["delta_rating"] = rating[end] - rating[start]
+        parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=WINDOW_COLS)
+    return pd.concat(parts, ignore_index=True)[WINDOW_COLS]
@@ -0,0 +1,236 @@
+import csv
+import json
+import random
+import shutil
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Dati sintetici per provare e misurare la pipeline senza i dati reali.
+# Scrive, con la stessa struttura dei file scaricati, i JSONL di input:
+#   lichess_games_matched.jsonl   partite con opening, analysis (eval per
+#                                 semimossa), clocks, division, players
+#   lichess_activity_matched.jsonl activity giornaliere (win/loss/draw per speed)
+#   lichess_users.jsonl           rating_history per game_type + puzzle.games
+#   fide_scraping_user.jsonl      RatingHistory FIDE mensile Standard/Rapid/Blitz
+# più i TSV delle aperture (openings/*.tsv) per generate_csv_openings.py.
+# Gli stessi utenti compaiono in tutti i file (come nei dati "matched").
+#
+# La scala è il numero totale di partite (10^3 … 10^7); utenti, activity e
+# storie dei rating crescono in proporzione. I file sono scritti riga per
+# riga, senza tenere nulla in memoria. Con lo stesso seed l'output è identico.
+#
+# Uso: python synthetic_data.py <cartella> <n_partite> [seed]
+
+GAMES_PER_USER = 50
+SPEEDS = {"bullet": (60, 0.30), "blitz": (300, 0.40), "rapid": (600, 0.22), "classical": (1800, 0.05), "ultraBullet": (15, 0.03)}
+STATUSES = ["resign", "mate", "outoftime", "draw", "stalemate", "timeout"]
+FILLER_MOVES = ["Nf3", "Nc6", "Bb5", "a6", "Ba4", "Nf6", "O-O", "Be7", "Re1", "b5", "Bb3", "d6",
+                "c3", "h3", "Nbd7", "d4", "Bb7", "Nbd2", "Re8", "Bf1", "Qc2", "Rad1", "g6", "Kh1"]
+FIDE_MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+FIRST_TS = int(datetime(2022, 1, 1, tzinfo=timezone.utc).timestamp() * 1000)
+LAST_TS = int(datetime(2025, 6, 30, tzinfo=timezone.utc).timestamp() * 1000)
+DAY_MS = 86_400_000
+
+# TSV delle aperture lichess (eco, name, pgn) nella cartella files/ del progetto
+OPENINGS_SOURCE = Path(__file__).resolve().parent.parent / "files"
+FALLBACK_OPENINGS = [
+    ("B00", "King's Pawn Game", "1. e4"),
+    ("C20", "King's Pawn Game", "1. e4 e5"),
+    ("C50", "Italian Game", "1. e4 e5 2. Nf3 Nc6 3. Bc4"),
+    ("C60", "Ruy Lopez", "1. e4 e5 2. Nf3 Nc6 3. Bb5"),
+    ("B20", "Sicilian Defense", "1. e4 c5"),
+    ("C00", "French Defense", "1. e4 e6"),
+    ("D00", "Queen's Pawn Game", "1. d4 d5"),
+    ("D06", "Queen's Gambit", "1. d4 d5 2. c4"),
+    ("E60", "King's Indian Defense", "1. d4 Nf6 2. c4 g6"),
+    ("A10", "English Opening", "1. c4"),
+]
+
+
+def user_ids(n_games):
+    n_users = max(1, n_games // GAMES_PER_USER)
+    return [f"user{k:07d}" for k in range(n_users)]
+
+
+def load_openings():
+    """[(eco, name, [mosse SAN])] dai TSV di files/, oppure una piccola lista interna."""
+    rows = []
+    for path in sorted(OPENINGS_SOURCE.glob("[a-e].tsv")):
+        with open(path, encoding="utf-8", newline="") as f:
+            rows += [(r["eco"], r["name"], r["pgn"]) for r in csv.DictReader(f, delimiter="\t")]
+    rows = rows or FALLBACK_OPENINGS
+    return [(eco, name, [m for m in pgn.split() if not m.endswith(".")]) for eco, name, pgn in rows]
+
+
+def write_openings_tsv(out_dir):
+    """Copia i TSV delle aperture in out_dir/openings (input di generate_csv_openings.py)."""
+    target = Path(out_dir) / "openings"
+    target.mkdir(parents=True, exist_ok=True)
+    sources = sorted(OPENINGS_SOURCE.glob("[a-e].tsv"))
+    for path in sources:
+        shutil.copyfile(path, target / path.name)
+    if not sources:
+        with open(target / "a.tsv", "w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f, delimiter="\t")
+            writer.writerow(["eco", "name", "pgn"])
+            writer.writerows(FALLBACK_OPENINGS)
+    return target
+
+
+def count_rows(path, sep=","):
+    """Righe di dati di un CSV/TSV (senza intestazione)."""
+    with open(path, encoding="utf-8", newline="") as f:
+        return max(0, sum(1 for _ in csv.reader(f, delimiter=sep)) - 1)
+
+
+def _game(rng, user, openings, rating):
+    speed = rng.choices(list(SPEEDS), weights=[w for _, w in SPEEDS.values()])[0]
+    base_clock = SPEEDS[speed][0] * 100  # centesimi di secondo, come lichess
+    eco, name, theory = rng.choice(openings)
+    plies = len(theory) + rng.randint(10, 100)
+    moves = theory + [rng.choice(FILLER_MOVES) for _ in range(plies - len(theory))]
+    color, other = ("white", "black") if rng.random() < 0.5 else ("black", "white")
+    status = rng.choice(STATUSES)
+    game = {
+        "id": f"{rng.getrandbits(40):010x}",
+        "username": user,
+        "createdAt": rng.randint(FIRST_TS, LAST_TS),
+        "speed": speed,
+        "status": status,
+        "moves": " ".join(moves),
+        "players": {
+            color: {"user": {"id": user.lower()}, "rating": rating},
+            other: {"user": {"id": f"opp{rng.randint(0, 999_999)}"}, "rating": rating + rng.randint(-200, 200)},
+        },
+        "opening": {"eco": eco, "name": name, "ply": len(theory)},
+    }
+    if status not in ("draw", "stalemate"):
+        game["winner"] = rng.choice(["white", "black"])
+    if rng.random() < 0.7:  # partite analizzate
+        evals, e = [], rng.randint(-30, 30)
+        for _ in range(plies):
+            e += rng.randint(-60, 60)
+            evals.append({"eval": e})
+        if status == "mate":
+            evals[-1] = {"mate": 1}
+        game["analysis"] = evals
+        for side in ("white", "black"):
+            game["players"][side]["analysis"] = {
+                "inaccuracy": rng.randint(0, 8), "mistake": rng.randint(0, 5), "blunder": rng.randint(0, 4),
+                "acpl": rng.randint(5, 120), "accuracy": rng.randint(40, 99),
+            }
+        game["division"] = {"middle": min(plies, rng.randint(12, 30)), "end": min(plies, rng.randint(40, 90))}
+    if speed != "classical" or rng.random() < 0.5:
+        clocks, c = [], base_clock
+        for _ in range(plies):
+            c = max(0, c - rng.randint(0, max(1, base_clock // 30)))
+            clocks.append(c)
+        game["clocks"] = clocks
+    return game
+
+
+def write_games(path, users, n_games, rng, openings):
+    """Partite divise tra gli utenti; una riga per utente con le sessioni di partite."""
+    per_user = [n_games // len(users)] * len(users)
+    for k in range(n_games % len(users)):
+        per_user[k] += 1
+    with open(path, "w", encoding="utf-8") as f:
+        for user, n in zip(users, per_user):
+            rating = rng.randint(800, 2600)
+            sessions, left = [], n
+            while left:
+                size = min(left, rng.randint(1, 30))
+                sessions.append({"details": [_game(rng, user, openings, rating) for _ in range(size)]})
+                left -= size
+            f.write(json.dumps({user: sessions}) + "\n")
+    return n_games
+
+
+def write_activity(path, users, rng):
+    """Un'activity per giorno di gioco, con i risultati per speed."""
+    n_activities = 0
+    days_per_user = max(1, GAMES_PER_USER // 5)
+    with open(path, "w", encoding="utf-8") as f:
+        for user in users:
+            acts = []
+            start_days = rng.sample(range((LAST_TS - FIRST_TS) // DAY_MS), days_per_user)
+            for day in sorted(start_days, reverse=True):  # lichess: dalla più recente
+                start = FIRST_TS + day * DAY_MS
+                games = {}
+                for speed in rng.sample(list(SPEEDS), rng.randint(1, 3)):
+                    games[speed] = {"win": rng.randint(0, 6), "loss": rng.randint(0, 6), "draw": rng.randint(0, 2)}
+                acts.append({"interval": {"start": start, "end": start + DAY_MS}, "games": games})
+            n_activities += len(acts)
+            f.write(json.dumps({user: acts}) + "\n")
+    return n_activities
+
+
+def write_users(path, users, rng):
+    """rating_history per game_type con chiavi "G-M-AAAA" (mese in base 0)."""
+    n_entries = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for user in users:
+            profile = {}
+            for game_type in ["puzzle", "bullet", "blitz", "rapid", "classical"]:
+                rating, history = rng.randint(800, 2600), {}
+                for _ in range(rng.randint(0, 60)):
+                    day = datetime.fromtimestamp(rng.randint(FIRST_TS, LAST_TS) / 1000, timezone.utc)
+                    rating = max(400, rating + rng.randint(-40, 40))
+                    history[f"{day.day}-{day.month - 1}-{day.year}"] = rating
+                profile[game_type] = {"games": rng.randint(0, 5000), "rating_history": history}
+                n_entries += len(history)
+            f.write(json.dumps({user: profile}) + "\n")
+    return n_entries
+
+
+def write_fide(path, users, rng):
+    """RatingHistory FIDE mensile (dalla più recente), con mesi e controlli mancanti."""
+    n_entries = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for user in users:
+            ratings = {ctl: rng.randint(1000, 2500) for ctl in ("Standard", "Rapid", "Blitz")}
+            first = rng.randint(2019 * 12, 2024 * 12)
+            history = []
+            for month in range(first, 2025 * 12 + 6):
+                if rng.random() < 0.25:
+                    continue  # mese senza pubblicazione
+                entry = {"Period": f"{month // 12}-{FIDE_MONTHS[month % 12]}"}
+                for ctl in ratings:
+                    if rng.random() < 0.85:
+                        games = rng.choice([0, 0, 0, 1, 2, 5, 9])
+                        ratings[ctl] += rng.randint(-15, 15) if games else 0
+                        entry[ctl] = {"Rating": str(ratings[ctl]), "Games": str(games)}
+                history.append(entry)
+            history.reverse()
+            n_entries += len(history)
+            f.write(json.dumps({user: {"FIDE_Profile": {"RatingHistory": history}}}) + "\n")
+    return n_entries
+
+
+def generate(out_dir, n_games, seed=0):
+    """
+    Scrive i file sintetici in out_dir e restituisce i conteggi (anche in
+    synthetic_manifest.json) usati dal benchmark per le righe al secondo.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    users = user_ids(n_games)
+    counts = {
+        "users": len(users),
+        "games": write_games(out / "lichess_games_matched.jsonl", users, n_games, rng, load_openings()),
+        "activities": write_activity(out / "lichess_activity_matched.jsonl", users, rng),
+        "rating_entries": write_users(out / "lichess_users.jsonl", users, rng),
+        "fide_entries": write_fide(out / "fide_scraping_user.jsonl", users, rng),
+    }
+    counts["opening_rows"] = sum(count_rows(path, sep="\t") for path in write_openings_tsv(out).glob("*.tsv"))
+    with open(out / "synthetic_manifest.json", "w", encoding="utf-8") as f:
+        json.dump({"n_games": n_games, "seed": seed, **counts}, f, indent=2)
+    return counts
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else "synthetic"
+    scale = int(float(sys.argv[2])) if len(sys.argv) > 2 else 1000
+    print(generate(target, scale, int(sys.argv[3]) if len(sys.argv) > 3 else 0))
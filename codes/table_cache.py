@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# Cache su disco delle tabelle derivate dai JSONL grezzi.
+# Ogni cache ha un file di metadati con l'hash del contenuto dei sorgenti:
+# se un sorgente cambia la cache viene ricostruita, altrimenti si riusa.
+
+HASH_CHUNK = 8 * 1024 * 1024
+
+
+def file_content_hash(path):
+    """Hash (blake2b) del contenuto del file, letto a blocchi."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def source_fingerprint(path, previous=None):
+    """
+    {size, mtime_ns, hash} del sorgente. Se size e mtime coincidono con
+    `previous` (metadati della cache esistente) l'hash già calcolato viene
+    riusato senza rileggere il file.
+    """
+    st = os.stat(path)
+    if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+        return dict(previous)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "hash": file_content_hash(path)}
+
+
+def read_cache_meta(meta_path):
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def cache_is_fresh(meta_path, sources, version=1):
+    """
+    True se la cache descritta da meta_path è stata costruita dagli stessi
+    sorgenti (stesso hash del contenuto) e con la stessa versione del formato.
+    Restituisce (fresh, fingerprints) per poter riscrivere i metadati senza ricalcolare.
+    """
+    meta = read_cache_meta(meta_path) or {}
+    old = meta.get("sources", {})
+    fingerprints = {str(p): source_fingerprint(p, old.get(str(p))) for p in sources}
+    fresh = (
+        meta.get("version") == version
+        and {k: v["hash"] for k, v in fingerprints.items()} == {k: v.get("hash") for k, v in old.items()}
+    )
+    return fresh, fingerprints
+
+
+@contextmanager
+def atomic_output(path, suffix=""):
+    """
+    Percorso temporaneo unico nella cartella di `path` (con estensione
+    `suffix`): a fine blocco sostituisce `path` con os.replace, in caso di
+    errore viene cancellato. Più processi che scrivono la stessa cache non
+    si cancellano i temporanei a vicenda e chi legge trova sempre il file
+    precedente o quello completo, mai uno troncato.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp" + suffix)
+    os.close(fd)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def write_cache_meta(meta_path, fingerprints, version=1, **extra):
+    with atomic_output(meta_path) as tmp:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "sources": fingerprints, **extra}, f, indent=2)